@@ -1,22 +1,31 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from pymongo import MongoClient
-from datetime import datetime
 from dotenv import load_dotenv
-import bcrypt
 import os
 
 from groups_api import groups_bp, init_groups_db
 from users_api import users_bp, init_users_db
-from products_api import products_bp, init_products_db, init_products_relationships
+from products_api import products_bp, init_products_db, init_products_relationships, init_product_counter
 from categories_api import categories_bp, init_categories_db
 from schedule_api import schedules_bp, init_schedules_db
 from staffs_api import staffs_bp, init_staffs_db
-from transactions_api import transactions_bp, init_transactions_db, init_transactions_relationships
+from transactions_api import transactions_bp, init_transactions_db, init_transactions_relationships, init_transaction_counters
 from services_api import service_types_bp, init_service_types_db, init_service_types_relationships
 from sales_api import sales_bp, init_sales_db
 from salesReport_api import sales_report_bp, init_sales_report_db
 from inventoryReport_api import inventory_report_bp, init_inventory_report_db
+from dashboard_api import dashboard_bp, init_dashboard_db
+from counters import init_counters_db
+from sales_rollup import init_sales_rollup_db, ensure_daily_sales
+from stock_ledger import init_stock_ledger_db, ensure_stock_snapshots
+from reference_cache import init_reference_cache
+from db_indexes import ensure_indexes, backfill_archive_flags
+from json_provider import init_json_provider
+from passwords import init_passwords_db, verify_password, login_recorder, PasswordServiceBusy
+from change_stamps import init_change_stamps
+from metrics import init_metrics, command_metrics
+from query_budget import init_query_budget, query_tracker
 
 load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI")
@@ -24,6 +33,9 @@ if not MONGO_URI:
     raise ValueError("MONGO_URI not set in .env")
 
 app = Flask(__name__)
+init_json_provider(app)
+init_metrics(app)
+init_query_budget(app)
 CORS(app, origins=[
     "http://localhost:3000",         # React dev
     "http://127.0.0.1:3000",        # React dev
@@ -33,38 +45,9 @@ CORS(app, origins=[
     "https://copycornersystem-backend.onrender.com"  # backend itself (optional, safe)
 ], supports_credentials=True)
 
-# Password hashing helper functions
-def hash_password(password):
-    """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-
-def check_password(plain_password, hashed_password):
-    """Check if a plain password matches the hashed password"""
-    if not hashed_password:
-        return False
-        
-    try:
-        # If hashed_password is bytes (from bcrypt)
-        if isinstance(hashed_password, bytes):
-            return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password)
-        # If hashed_password is string (might be from migration)
-        elif isinstance(hashed_password, str):
-            # Try to decode as base64 first (if it was encoded for storage)
-            import base64
-            try:
-                hashed_bytes = base64.b64decode(hashed_password)
-                return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_bytes)
-            except:
-                # If it's not base64, try direct string comparison (for legacy)
-                return hashed_password == plain_password
-        else:
-            return False
-    except Exception as e:
-        print(f"Password check error: {e}")
-        return False
-
 try:
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
+    # command_metrics times every command for /metrics; query_tracker enforces query budgets
+    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000, event_listeners=[command_metrics, query_tracker])
     db = client["CopyCornerSystem"]
     
     # Initialize collections
@@ -76,6 +59,16 @@ try:
     staffs_collection = db["staffs"]
     transactions_collection = db["transactions"]
     service_types_collection = db["service_type"]
+    counters_collection = db["counters"]
+    daily_sales_collection = db["daily_sales"]
+    stock_movements_collection = db["stock_movements"]
+
+    # Create the indexes the blueprints' queries need (no-op when present).
+    # The is_archived backfill always runs: listings match is_archived: False.
+    if os.getenv("CREATE_INDEXES_ON_STARTUP", "true").lower() in ("1", "true", "yes"):
+        ensure_indexes(db)
+    else:
+        backfill_archive_flags(db)
 
     # Initialize databases
     init_groups_db(groups_collection, users_collection)
@@ -86,15 +79,32 @@ try:
     init_staffs_db(staffs_collection, users_collection, groups_collection, schedule_collection)
     init_transactions_db(transactions_collection, products_collection)
     init_service_types_db(service_types_collection, transactions_collection)
-    init_sales_db(transactions_collection, service_types_collection)
-    init_sales_report_db(transactions_collection, service_types_collection)
+    init_sales_db(transactions_collection, service_types_collection, daily_sales_collection)
+    init_sales_report_db(transactions_collection, service_types_collection, daily_sales_collection)
     init_inventory_report_db(products_collection, categories_collection)
+    init_dashboard_db(products_collection, transactions_collection, users_collection, daily_sales_collection)
+    init_counters_db(counters_collection)
+    init_sales_rollup_db(daily_sales_collection, transactions_collection)
+    init_stock_ledger_db(stock_movements_collection, products_collection)
+    init_reference_cache(categories_collection, service_types_collection, groups_collection)
+    init_passwords_db(users_collection)
+    init_change_stamps()
     
     # Initialize relationships
-    init_products_relationships(categories_collection, transactions_collection)
+    init_products_relationships(categories_collection, transactions_collection, stock_movements_collection)
     init_service_types_relationships(categories_collection, products_collection)
     init_transactions_relationships(service_types_collection, categories_collection)
     
+    # Seed ID and queue number counters from existing transactions and products
+    init_transaction_counters()
+    init_product_counter()
+    
+    # Build the daily sales rollup from history on first run
+    ensure_daily_sales()
+    
+    # Record every product's opening stock the first time the ledger runs
+    ensure_stock_snapshots()
+    
     client.admin.command("ping")
     print("✅ Connected to MongoDB Atlas!")
 except Exception as e:
@@ -112,6 +122,7 @@ app.register_blueprint(service_types_bp)
 app.register_blueprint(sales_bp)
 app.register_blueprint(sales_report_bp)
 app.register_blueprint(inventory_report_bp)
+app.register_blueprint(dashboard_bp)
 
 @app.route("/")
 def home():
@@ -137,24 +148,23 @@ def login():
         if user.get("status") != "Active":
             return jsonify({"error": "Your account is inactive. Please contact an administrator."}), 401
         
-        # Check password using bcrypt
+        # Check password using bcrypt, on the bounded password pool
         user_password = user.get("password")
-        if user_password and check_password(password, user_password):
-            # Get user's group
+        try:
+            password_ok, new_hash = verify_password(password, user_password) if user_password else (False, None)
+        except PasswordServiceBusy as e:
+            return jsonify({"error": str(e)}), 503
+        
+        if password_ok:
+            # Get user's group; read fresh, a cached copy could still show a deactivated role as Active
             group = groups_collection.find_one({"_id": user["group_id"]})
             
             # Check if role is inactive
             if group and group.get("status") != "Active":
                 return jsonify({"error": "Your user role has been deactivated. Please contact an administrator."}), 401
             
-            # Update last login
-            users_collection.update_one(
-                {"_id": user["_id"]},
-                {"$set": {
-                    "last_login": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                }}
-            )
+            # Update last login (and upgrade a legacy hash) in the background
+            login_recorder.record(user["_id"], user_password, new_hash)
             
             return jsonify({
                 "message": "Login successful!",
@@ -0,0 +1,9 @@
+"""Benchmark suite for the API at realistic data volumes.
+
+    python -m benchmarks.run --transactions 100000 --output bench-100k.json
+    python -m benchmarks.compare bench-before.json bench-after.json
+
+Run from the backend directory against a local mongod. The run replaces the
+CopyCornerSystem database on that server with a synthetic dataset built from
+the shapes in mongo-backup/.
+"""
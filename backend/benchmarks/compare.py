@@ -0,0 +1,61 @@
+# benchmarks/compare.py
+"""Compare two benchmark result files.
+
+    python -m benchmarks.compare bench-before.json bench-after.json
+
+Exits with status 1 when any endpoint's p95 grew by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ['p50_ms', 'p95_ms', 'p99_ms', 'mongo_commands_mean', 'peak_request_mb']
+
+def change(before, after):
+    if before is None or after is None:
+        return None
+    if before == 0:
+        return 0.0 if after == 0 else float('inf')
+    return (after - before) / before * 100
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10.0, help='allowed p95 regression in percent')
+    args = parser.parse_args()
+
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+
+    for key in ('transactions', 'seed', 'days'):
+        if before['meta'].get(key) != after['meta'].get(key):
+            print(f"⚠️ Different {key}: {before['meta'].get(key)} vs {after['meta'].get(key)}")
+
+    regressions = []
+    for name in sorted(set(before['results']) | set(after['results'])):
+        old = before['results'].get(name)
+        new = after['results'].get(name)
+        if not old or not new:
+            print(f"{name}: only in {'after' if new else 'before'}")
+            continue
+        parts = []
+        for metric in METRICS:
+            delta = change(old.get(metric), new.get(metric))
+            if delta is None:
+                continue
+            parts.append(f"{metric} {old[metric]} -> {new[metric]} ({delta:+.1f}%)")
+        print(f"{name}\n   " + "\n   ".join(parts))
+        delta = change(old.get('p95_ms'), new.get('p95_ms'))
+        if delta is not None and delta > args.threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"\n❌ p95 regressed more than {args.threshold}%: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\n✅ No p95 regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# benchmarks/dataset.py
+from bson import ObjectId, json_util
+from datetime import datetime, timedelta
+import calendar
+import math
+import os
+import random
+
+from transactions_api import SHEET_SERVICES
+
+BACKUP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mongo-backup')
+
+# Copied as-is; only transactions are generated
+REFERENCE_COLLECTIONS = ['categories', 'groups', 'users', 'staffs', 'products', 'service_type', 'schedule']
+
+
+FIRST_NAMES = ['Juan', 'Maria', 'Jose', 'Ana', 'Mark', 'Angel', 'John', 'Grace', 'Paolo', 'Bea',
+               'Carlo', 'Joy', 'Miguel', 'Kristine', 'Rafael', 'Nicole', 'Adrian', 'Camille']
+LAST_INITIALS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+def load_backup(name):
+    path = os.path.join(BACKUP_DIR, f'{name}.json')
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return json_util.loads(f.read())
+
+def zipf_weights(count, exponent=1.2):
+    """Rank-skewed weights: the first item is the most common, like a shop's top service"""
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+class TransactionGenerator:
+    """Synthetic transactions shaped like mongo-backup/transactions.json.
+
+    Services follow a Zipf distribution led by the ones already in the backup,
+    dates cluster towards today with busier weekdays, and older transactions are
+    mostly Completed while the queue (Pending / In Progress) sits in the last days.
+    Everything is driven by one seeded Random, so a seed always gives the same data.
+    """
+
+    def __init__(self, services, products, categories, seed=42, days=365, today=None):
+        self.random = random.Random(seed)
+        self.days = days
+        self.today = today or (datetime.utcnow() + timedelta(hours=8)).date()
+
+        active = [s for s in services if s.get('status') == 'Active' and not s.get('is_archived')]
+        # Services seen in the real transactions lead the ranking
+        seen = [t['service_type'] for t in load_backup('transactions')]
+        active.sort(key=lambda s: (-seen.count(s['service_name']), s['service_name']))
+        self.services = active
+        self.service_weights = zipf_weights(len(active))
+
+        self.category_names = {category['_id']: category.get('name', '') for category in categories}
+        self.products_by_category = {}
+        for product in products:
+            if product.get('category_id') and not product.get('is_archived'):
+                self.products_by_category.setdefault(product['category_id'], []).append(product)
+
+        # Daily volume decays with age: recent months carry most of the rows
+        decay = 3 / max(days, 1)
+        weekday_factor = [1.2, 1.1, 1.1, 1.1, 1.3, 0.8, 0.4]
+        self.day_offsets = list(range(days))
+        self.day_weights = [
+            math.exp(-decay * offset) * weekday_factor[(self.today - timedelta(days=offset)).weekday()]
+            for offset in self.day_offsets
+        ]
+
+    def status_for(self, age_days):
+        roll = self.random.random()
+        if age_days == 0:
+            return 'Pending' if roll < 0.35 else 'In Progress' if roll < 0.6 else 'Completed'
+        if age_days < 3:
+            return 'Pending' if roll < 0.05 else 'In Progress' if roll < 0.1 else 'Completed'
+        # Older unfinished work is rare; the lower-case spelling also exists in the wild
+        return 'Pending' if roll < 0.01 else 'completed' if roll < 0.03 else 'Completed'
+
+    def transaction(self, seq):
+        rnd = self.random
+        service = rnd.choices(self.services, self.service_weights)[0]
+        age = rnd.choices(self.day_offsets, self.day_weights)[0]
+        day = self.today - timedelta(days=age)
+        # Shop hours, 8:00-19:00 Philippine time, stored as UTC
+        created_at = datetime(day.year, day.month, day.day, 0, 0) + timedelta(
+            minutes=rnd.randint(0, 11 * 60))
+
+        product = None
+        candidates = self.products_by_category.get(service.get('category_id'))
+        if candidates:
+            product = rnd.choice(candidates)
+
+        quantity = max(1, int(rnd.expovariate(1 / 3)))
+        total_pages = rnd.randint(1, 60) if service['service_name'] in SHEET_SERVICES else 0
+        price_per_unit = float(product.get('unit_price', 5)) if product else float(rnd.choice([5, 10, 25, 50]))
+        units = total_pages * quantity if total_pages else quantity
+        product_name = product['product_name'] if product else ''
+        category_name = self.category_names.get(service.get('category_id'), '')
+
+        return {
+            # Timestamp plus sequence: unique, time-ordered and the same for every run
+            '_id': ObjectId(calendar.timegm(created_at.timetuple()).to_bytes(4, 'big') + seq.to_bytes(8, 'big')),
+            'queue_number': f"{seq % 1000:03d}",
+            'transaction_id': f"T-{seq:03d}",
+            'customer_name': f"{rnd.choice(FIRST_NAMES)} {rnd.choice(LAST_INITIALS)}.",
+            'service_type': service['service_name'],
+            'paper_type': product_name if category_name == 'Paper' else '',
+            'size_type': product_name if category_name == 'T-shirt' else '',
+            'supply_type': product_name if category_name == 'Supplies' else '',
+            'product_id': product['_id'] if product else None,
+            'product_name': product_name,
+            'total_pages': total_pages,
+            'price_per_unit': price_per_unit,
+            'quantity': quantity,
+            'total_amount': round(price_per_unit * units, 2),
+            'date': day.strftime('%Y-%m-%d'),
+            'status': self.status_for(age),
+            'is_archived': rnd.random() < 0.1,
+            'created_at': created_at,
+            'updated_at': created_at + timedelta(minutes=rnd.randint(0, 90))
+        }
+
+    def batches(self, count, batch_size=10000):
+        """Yield lists of `count` transactions in insert-sized batches"""
+        batch = []
+        for seq in range(1, count + 1):
+            batch.append(self.transaction(seq))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+def load_dataset(db, transactions, seed=42, days=365):
+    """Replace db's contents with the backup reference data and `transactions` generated rows"""
+    for name in db.list_collection_names():
+        db.drop_collection(name)
+
+    reference = {}
+    for name in REFERENCE_COLLECTIONS:
+        reference[name] = load_backup(name)
+        if reference[name]:
+            db[name].insert_many(reference[name])
+
+    generator = TransactionGenerator(
+        reference['service_type'], reference['products'], reference['categories'], seed=seed, days=days)
+    inserted = 0
+    for batch in generator.batches(transactions):
+        db.transactions.insert_many(batch, ordered=False)
+        inserted += len(batch)
+        print(f"   📝 {inserted}/{transactions} transactions")
+    return inserted
@@ -0,0 +1,218 @@
+# benchmarks/run.py
+"""Load a synthetic dataset into a local mongod and time the API endpoints.
+
+    python -m benchmarks.run --transactions 100000 --output bench-100k.json
+
+BENCH_MONGO_URI (default mongodb://localhost:27017) selects the server. Its
+CopyCornerSystem database is dropped and reloaded, so remote servers are
+refused unless --allow-remote is given.
+"""
+from pymongo import MongoClient, monitoring
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from benchmarks.dataset import load_dataset
+
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+
+def endpoint_cases(today):
+    """(name, url) pairs timed by the suite"""
+    week_ago = (today - timedelta(days=6)).strftime('%Y-%m-%d')
+    month_ago = (today - timedelta(days=29)).strftime('%Y-%m-%d')
+    today_str = today.strftime('%Y-%m-%d')
+    return [
+        ('transactions_first_page', '/transactions?page=1&per_page=10'),
+        ('transactions_deep_page', '/transactions?page=500&per_page=10'),
+        ('transactions_completed', '/transactions/status/Completed?page=1&per_page=10'),
+        ('transactions_pending', '/transactions/status/Pending?page=1&per_page=10'),
+        ('transactions_search', '/transactions/status/Completed?page=1&per_page=10&search=Maria'),
+        ('transactions_archived', '/transactions/archived?page=1&per_page=10'),
+        ('sales_report_week', f'/reports/sales?start_date={week_ago}&end_date={today_str}'),
+        ('sales_report_month', f'/reports/sales?start_date={month_ago}&end_date={today_str}'),
+        ('sales_analytics', '/sales/analytics'),
+        ('inventory_report', '/reports/inventory'),
+        ('dashboard_summary', '/dashboard/summary'),
+        ('products', '/products?page=1&per_page=10'),
+        ('users', '/users?page=1&per_page=10'),
+        ('staffs', '/staffs?page=1&per_page=10'),
+    ]
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the MongoDB commands the app sends"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+# Extra requests per endpoint, traced for memory after the timed ones
+MEMORY_RUNS = 3
+
+def peak_rss_mb():
+    """Process-wide high-water mark, so only meaningful for the run as a whole"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def peak_request_memory_mb(client, url):
+    """Most memory one GET of url allocates at once, in MB.
+
+    tracemalloc only sees allocations made while it runs, so the dataset load
+    and app startup do not count. It slows requests down, which is why these
+    runs are separate from the timed ones.
+    """
+    peak = 0
+    tracemalloc.start()
+    try:
+        for _ in range(MEMORY_RUNS):
+            # Measured from what earlier runs left behind (e.g. a filled cache)
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            with contextlib.redirect_stdout(io.StringIO()):
+                client.get(url).get_data()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return round(peak / (1024 * 1024), 2)
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def time_endpoint(client, counter, url, iterations, warmup):
+    """Latency (ms) and MongoDB command counts for `iterations` GETs of url"""
+    latencies = []
+    commands = []
+    statuses = {}
+    for i in range(warmup + iterations):
+        before = counter.count
+        # The endpoints' debug prints still run, they just do not reach the terminal
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            response = client.get(url)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        latencies.append(elapsed * 1000)
+        commands.append(counter.count - before)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    latencies.sort()
+    return {
+        'url': url,
+        'iterations': iterations,
+        'status_codes': statuses,
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'max_ms': round(latencies[-1], 2),
+        'mongo_commands_mean': round(sum(commands) / len(commands), 2),
+        'mongo_commands_max': max(commands),
+        'peak_request_mb': peak_request_memory_mb(client, url)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='CopyCorner API benchmark')
+    parser.add_argument('--transactions', type=int, default=100000, help='synthetic transactions to load')
+    parser.add_argument('--days', type=int, default=365, help='days of history the transactions span')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--only', action='append', help='run just these cases (repeatable)')
+    parser.add_argument('--skip-load', action='store_true', help='reuse the data from the previous run')
+    parser.add_argument('--allow-remote', action='store_true')
+    parser.add_argument('--output', default='benchmark-results.json')
+    args = parser.parse_args()
+
+    mongo_uri = os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017")
+    if urlparse(mongo_uri).hostname not in LOCAL_HOSTS and not args.allow_remote:
+        print(f"❌ Refusing to replace data on {urlparse(mongo_uri).hostname}; pass --allow-remote to do it anyway")
+        sys.exit(1)
+
+    seed_client = MongoClient(mongo_uri)
+    mongod_version = seed_client.server_info().get('version')
+    if not args.skip_load:
+        print(f"🔄 Loading {args.transactions} transactions over {args.days} days (seed {args.seed})...")
+        started = time.perf_counter()
+        load_dataset(seed_client["CopyCornerSystem"], args.transactions, seed=args.seed, days=args.days)
+        print(f"✅ Loaded in {time.perf_counter() - started:.1f}s")
+    seed_client.close()
+
+    # Point the app at the benchmark server; nothing cached between requests
+    os.environ["MONGO_URI"] = mongo_uri
+    os.environ.setdefault("DASHBOARD_CACHE_TTL", "0")
+    os.environ.setdefault("ETAG_STAMP_TTL", "0")
+
+    counter = CommandCounter()
+    # Registered globally so the app's MongoClient picks it up when app.py creates it
+    monitoring.register(counter)
+
+    print("🔄 Starting the app (indexes, sales rollup, counters)...")
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+    startup_seconds = round(time.perf_counter() - started, 2)
+    client = app.test_client()
+
+    today = (datetime.utcnow() + timedelta(hours=8)).date()
+    results = {}
+    for name, url in endpoint_cases(today):
+        if args.only and name not in args.only:
+            continue
+        results[name] = time_endpoint(client, counter, url, args.iterations, args.warmup)
+        r = results[name]
+        print(f"   {name:<26} p50 {r['p50_ms']:>8} ms  p95 {r['p95_ms']:>8} ms  "
+              f"p99 {r['p99_ms']:>8} ms  {r['mongo_commands_mean']:>6} cmds  {r['peak_request_mb']} MB")
+
+    report = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat() + 'Z',
+            'git_revision': git_revision(),
+            'transactions': args.transactions,
+            'days': args.days,
+            'seed': args.seed,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'startup_seconds': startup_seconds,
+            'peak_rss_mb': peak_rss_mb(),
+            'python': platform.python_version(),
+            'mongod': mongod_version,
+        },
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"📄 Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,9 @@ from bson import ObjectId
 from datetime import datetime
 import os
 
+from reference_cache import invalidate_categories
+from change_stamps import bump, conditional_get
+
 categories_bp = Blueprint('categories', __name__)
 
 categories_collection = None
@@ -16,12 +19,34 @@ def init_categories_db(mongo_collection, products_coll, service_types_coll):
     products_collection = products_coll
     service_types_collection = service_types_coll
 
-def serialize_doc(doc):
-    if doc:
-        doc['_id'] = str(doc['_id'])
-    return doc
+def count_by_category(collection, category_ids, extra_match=None):
+    """Count documents per category_id with one $group for all given categories"""
+    match = {'category_id': {'$in': category_ids}}
+    if extra_match:
+        match.update(extra_match)
+    pipeline = [
+        {'$match': match},
+        {'$group': {'_id': '$category_id', 'count': {'$sum': 1}}}
+    ]
+    return {row['_id']: row['count'] for row in collection.aggregate(pipeline)}
+
+def attach_usage_counts(categories, active_products_only):
+    """Add product_count and service_type_count to each category"""
+    if not categories:
+        return categories
+    
+    category_ids = [category['_id'] for category in categories]
+    product_match = {'is_archived': {'$ne': True}} if active_products_only else None
+    product_counts = count_by_category(products_collection, category_ids, product_match)
+    service_counts = count_by_category(service_types_collection, category_ids)
+    
+    for category in categories:
+        category['product_count'] = product_counts.get(category['_id'], 0)
+        category['service_type_count'] = service_counts.get(category['_id'], 0)
+    return categories
 
 @categories_bp.route('/categories', methods=['GET'])
+@conditional_get('categories', 'products', 'service_type')
 def get_categories():
     try:
         page_param = request.args.get('page')
@@ -42,18 +67,9 @@ def get_categories():
         if not page_param and not per_page_param:
             categories = list(categories_collection.find(query).sort("created_at", 1))
             
-            for category in categories:
-                category_id = category['_id']
-                product_count = products_collection.count_documents({
-                    'category_id': category_id,
-                    'is_archived': {'$ne': True}
-                })
-                category['product_count'] = product_count
-                service_count = service_types_collection.count_documents({'category_id': category_id})
-                category['service_type_count'] = service_count
+            attach_usage_counts(categories, active_products_only=True)
             
-            serialized_categories = [serialize_doc(category) for category in categories]
-            return jsonify(serialized_categories)
+            return jsonify(categories)
         
         # Handle paginated request
         page = int(page_param or 1)
@@ -73,20 +89,10 @@ def get_categories():
         categories_cursor = categories_collection.find(query).sort("created_at", 1).skip(skip).limit(per_page)
         categories = list(categories_cursor)
         
-        for category in categories:
-            category_id = category['_id']
-            product_count = products_collection.count_documents({
-                'category_id': category_id,
-                'is_archived': {'$ne': True}
-            })
-            category['product_count'] = product_count
-            service_count = service_types_collection.count_documents({'category_id': category_id})
-            category['service_type_count'] = service_count
-        
-        serialized_categories = [serialize_doc(category) for category in categories]
+        attach_usage_counts(categories, active_products_only=True)
         
         return jsonify({
-            'categories': serialized_categories,
+            'categories': categories,
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -98,17 +104,18 @@ def get_categories():
         return jsonify({'error': str(e)}), 500
 
 @categories_bp.route('/categories/<category_id>', methods=['GET'])
+@conditional_get('categories', 'products', 'service_type')
 def get_category(category_id):
     try:
         category = categories_collection.find_one({'_id': ObjectId(category_id)})
         if category:
             products = list(products_collection.find({'category_id': ObjectId(category_id)}))
-            category['products'] = [serialize_doc(product) for product in products]
+            category['products'] = products
             
             service_types = list(service_types_collection.find({'category_id': ObjectId(category_id)}))
-            category['service_types'] = [serialize_doc(service) for service in service_types]
+            category['service_types'] = service_types
             
-            return jsonify(serialize_doc(category))
+            return jsonify(category)
         return jsonify({'error': 'Category not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -135,6 +142,8 @@ def create_category():
         }
         
         result = categories_collection.insert_one(new_category)
+        invalidate_categories()
+        bump('categories')
         new_category['_id'] = str(result.inserted_id)
         return jsonify(new_category), 201
     except Exception as e:
@@ -177,6 +186,8 @@ def update_category(category_id):
             {'_id': ObjectId(category_id)},
             {'$set': update_data}
         )
+        invalidate_categories()
+        bump('categories')
         
         if result.matched_count:
             return jsonify({'message': 'Category updated successfully'})
@@ -223,6 +234,8 @@ def archive_category(category_id):
                 'updated_at': datetime.utcnow()
             }}
         )
+        invalidate_categories()
+        bump('categories')
         
         if result.modified_count:
             return jsonify({'message': 'Category archived successfully'})
@@ -261,6 +274,8 @@ def restore_category(category_id):
                 'updated_at': datetime.utcnow()
             }}
         )
+        invalidate_categories()
+        bump('categories')
         
         if result.modified_count:
             return jsonify({'message': 'Category restored successfully'})
@@ -271,6 +286,7 @@ def restore_category(category_id):
 
 # GET ARCHIVED CATEGORIES - UPDATED WITH PAGINATION
 @categories_bp.route('/categories/archived', methods=['GET'])
+@conditional_get('categories', 'products', 'service_type')
 def get_archived_categories():
     try:
         page_param = request.args.get('page')
@@ -291,15 +307,9 @@ def get_archived_categories():
         if not page_param and not per_page_param:
             categories = list(categories_collection.find(query).sort("archived_at", -1))
             
-            for category in categories:
-                category_id = category['_id']
-                product_count = products_collection.count_documents({'category_id': category_id})
-                category['product_count'] = product_count
-                service_count = service_types_collection.count_documents({'category_id': category_id})
-                category['service_type_count'] = service_count
+            attach_usage_counts(categories, active_products_only=False)
             
-            serialized_categories = [serialize_doc(category) for category in categories]
-            return jsonify(serialized_categories)
+            return jsonify(categories)
         
         # Handle paginated request
         page = int(page_param or 1)
@@ -319,17 +329,10 @@ def get_archived_categories():
         categories_cursor = categories_collection.find(query).sort("archived_at", -1).skip(skip).limit(per_page)
         categories = list(categories_cursor)
         
-        for category in categories:
-            category_id = category['_id']
-            product_count = products_collection.count_documents({'category_id': category_id})
-            category['product_count'] = product_count
-            service_count = service_types_collection.count_documents({'category_id': category_id})
-            category['service_type_count'] = service_count
-        
-        serialized_categories = [serialize_doc(category) for category in categories]
+        attach_usage_counts(categories, active_products_only=False)
         
         return jsonify({
-            'categories': serialized_categories,
+            'categories': categories,
             'pagination': {
                 'page': page,
                 'per_page': per_page,
@@ -341,22 +344,22 @@ def get_archived_categories():
         return jsonify({'error': str(e)}), 500
 
 @categories_bp.route('/categories/<category_id>/products', methods=['GET'])
+@conditional_get('products')
 def get_products_by_category(category_id):
     try:
         products = list(products_collection.find({
             'category_id': ObjectId(category_id),
             'is_archived': {'$ne': True}
         }).sort("product_name", 1))
-        serialized_products = [serialize_doc(product) for product in products]
-        return jsonify(serialized_products)
+        return jsonify(products)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @categories_bp.route('/categories/<category_id>/service-types', methods=['GET'])
+@conditional_get('service_type')
 def get_service_types_by_category(category_id):
     try:
         service_types = list(service_types_collection.find({'category_id': ObjectId(category_id), 'status': 'Active'}).sort("service_name", 1))
-        serialized_service_types = [serialize_doc(service) for service in service_types]
-        return jsonify(serialized_service_types)
+        return jsonify(service_types)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
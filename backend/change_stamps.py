@@ -0,0 +1,104 @@
+# change_stamps.py
+from flask import request, make_response
+from functools import wraps
+import hashlib
+import os
+import threading
+import time
+
+import counters
+
+stamp_ttl = 300
+version_ttl = 1
+
+# Versions read from counters, per collection name: (seq, monotonic read time)
+cached_versions = {}
+cached_versions_lock = threading.Lock()
+
+def init_change_stamps():
+    """Read the settings from app.py; the versions live in the counters collection"""
+    global stamp_ttl, version_ttl
+    # Writes through the API bump the shared versions. Writes straight to
+    # MongoDB (mongosh, scripts that do not call bump_stamps) are only picked
+    # up when ETags roll over this often. 0 turns conditional GETs off.
+    stamp_ttl = float(os.getenv("ETAG_STAMP_TTL", "300"))
+    # Seconds each process reuses the versions it read, so polling clients get
+    # 304s without a MongoDB round trip. Another worker's write shows up within
+    # this long; this worker's own writes at once. 0 reads them on every request.
+    version_ttl = float(os.getenv("ETAG_VERSION_CACHE_SECONDS", "1"))
+
+def stamp_key(name):
+    return f"stamp:{name}"
+
+def bump_stamps(counters_collection, collections):
+    """$inc the stored version of each collection; scripts editing reference data call this too"""
+    for name in collections:
+        counters_collection.update_one(
+            {'_id': stamp_key(name)},
+            {'$inc': {'seq': 1}},
+            upsert=True
+        )
+
+def bump(*collections):
+    """Record a write to these collections; every ETag that depends on them changes, in every worker"""
+    bump_stamps(counters.counters_collection, collections)
+    with cached_versions_lock:
+        for name in collections:
+            cached_versions.pop(name, None)
+
+def read_versions(collections):
+    """Current version of each collection, from this process's copy when it is fresh enough"""
+    now = time.monotonic()
+    versions = {}
+    with cached_versions_lock:
+        for name in collections:
+            entry = cached_versions.get(name)
+            if entry and now - entry[1] < version_ttl:
+                versions[name] = entry[0]
+
+    missing = [name for name in collections if name not in versions]
+    if missing:
+        stored = {
+            doc['_id']: doc['seq']
+            for doc in counters.counters_collection.find({'_id': {'$in': [stamp_key(name) for name in missing]}})
+        }
+        with cached_versions_lock:
+            for name in missing:
+                versions[name] = stored.get(stamp_key(name), 0)
+                cached_versions[name] = (versions[name], now)
+    return [versions[name] for name in collections]
+
+def resource_etag(collections):
+    """Strong ETag for the current request URL (path and query) over these collections"""
+    versions = read_versions(collections)
+    # The same in every worker, so any of them can answer 304
+    epoch = int(time.time() // stamp_ttl)
+    key = f"{epoch}|{versions}|{request.full_path}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def conditional_get(*collections):
+    """Answer GETs with If-None-Match from the change stamps, without calling the view.
+
+    The stamps are read before the view runs, so a write that lands during the
+    request only makes the next request miss, never serves stale data as current.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if stamp_ttl <= 0:
+                return view(*args, **kwargs)
+
+            etag = resource_etag(collections)
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            # Browsers keep the body but revalidate on every request
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
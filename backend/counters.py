@@ -0,0 +1,31 @@
+from pymongo import ReturnDocument
+
+# MongoDB collection (will be initialized from app.py)
+counters_collection = None
+
+def init_counters_db(mongo_collection):
+    """Initialize the counters collection from app.py"""
+    global counters_collection
+    counters_collection = mongo_collection
+
+def seed_counter(name, value):
+    """Raise a counter to at least `value` without ever moving it backwards"""
+    counters_collection.update_one(
+        {'_id': name},
+        {'$max': {'seq': int(value)}},
+        upsert=True
+    )
+
+def next_sequence(name, count=1):
+    """Atomically advance a named counter and return its new value.
+
+    With count > 1 the caller owns the contiguous block ending at the
+    returned value, i.e. value - count + 1 through value.
+    """
+    counter = counters_collection.find_one_and_update(
+        {'_id': name},
+        {'$inc': {'seq': int(count)}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['seq']
@@ -0,0 +1,132 @@
+from flask import Blueprint, jsonify
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+from staffs_api import get_staff_group_ids
+from live_events import transaction_events
+
+# Create Blueprint for dashboard routes
+dashboard_bp = Blueprint('dashboard', __name__)
+
+# MongoDB collections (will be initialized from app.py)
+products_collection = None
+transactions_collection = None
+users_collection = None
+daily_sales_collection = None
+
+# Last computed summary, shared by every dashboard tab polling this process
+summary_cache = {'data': None, 'computed_at': 0}
+summary_lock = threading.Lock()
+summary_ttl = 30
+
+def init_dashboard_db(products_coll, transactions_coll, users_coll, daily_sales_coll):
+    """Initialize the collections from app.py"""
+    global products_collection, transactions_collection, users_collection, daily_sales_collection, summary_ttl
+    products_collection = products_coll
+    transactions_collection = transactions_coll
+    users_collection = users_coll
+    daily_sales_collection = daily_sales_coll
+
+    # Matches the dashboard's 30 second refresh so each poll costs one cache hit
+    summary_ttl = float(os.getenv("DASHBOARD_CACHE_TTL", "30"))
+    summary_cache['data'] = None
+
+    # Dashboards refetch on transaction events, so those must not get the old summary
+    transaction_events.add_listener(invalidate_summary)
+
+def invalidate_summary(event=None, data=None):
+    with summary_lock:
+        summary_cache['data'] = None
+
+def product_summary():
+    """Active product count and low stock items (stock at or below minimum, default 10)"""
+    pipeline = [
+        {'$match': {'is_archived': {'$ne': True}}},
+        {'$facet': {
+            'total': [{'$count': 'count'}],
+            'low_stock': [
+                {'$match': {'$expr': {'$lte': [
+                    '$stock_quantity',
+                    {'$cond': ['$minimum_stock', '$minimum_stock', 10]}
+                ]}}},
+                {'$sort': {'created_at': 1}},
+                {'$project': {'product_name': 1, 'stock_quantity': 1, 'minimum_stock': 1}}
+            ]
+        }}
+    ]
+    result = next(products_collection.aggregate(pipeline))
+    total = result['total'][0]['count'] if result['total'] else 0
+    return total, result['low_stock']
+
+def sales_summary(today):
+    """Revenue for the last 7 days and all-time revenue per service, from daily_sales"""
+    weekly_start_str = (today - timedelta(days=6)).strftime('%Y-%m-%d')
+    today_str = today.strftime('%Y-%m-%d')
+
+    pipeline = [
+        {'$facet': {
+            'weekly': [
+                {'$match': {'date': {'$gte': weekly_start_str, '$lte': today_str}}},
+                {'$group': {'_id': None, 'total': {'$sum': '$revenue'}}}
+            ],
+            'services': [
+                {'$match': {'service_type': {'$nin': [None, '']}}},
+                {'$group': {'_id': '$service_type', 'total_sales': {'$sum': '$revenue'}}},
+                {'$sort': {'total_sales': -1, '_id': 1}}
+            ]
+        }}
+    ]
+    result = next(daily_sales_collection.aggregate(pipeline))
+    weekly_sales = result['weekly'][0]['total'] if result['weekly'] else 0
+    by_service = {
+        'labels': [row['_id'] for row in result['services']],
+        'data': [row['total_sales'] for row in result['services']]
+    }
+    return weekly_sales, by_service
+
+def recent_completed_transactions(limit=5):
+    fields = {'customer_name': 1, 'service_type': 1, 'total_amount': 1, 'date': 1, 'status': 1, 'created_at': 1}
+    return list(transactions_collection.find(
+        {'is_archived': False, 'status': 'Completed'}, fields
+    ).sort('created_at', -1).limit(limit))
+
+def build_dashboard_summary():
+    # Use Philippines time, same as the sales analytics
+    today = (datetime.utcnow() + timedelta(hours=8)).date()
+
+    total_products, low_stock_items = product_summary()
+    weekly_sales, sales_by_service = sales_summary(today)
+
+    return {
+        'totals': {
+            'products': total_products,
+            'staffs': users_collection.count_documents({
+                'group_id': {'$in': get_staff_group_ids()},
+                'is_archived': {'$ne': True}
+            }),
+            'transactions': transactions_collection.count_documents({'is_archived': False})
+        },
+        'overall_sales': weekly_sales,
+        'sales_by_service': sales_by_service,
+        'recent_transactions': recent_completed_transactions(),
+        'low_stock_items': low_stock_items,
+        'generated_at': datetime.utcnow()
+    }
+
+def get_cached_summary():
+    with summary_lock:
+        if summary_cache['data'] is None or time.monotonic() - summary_cache['computed_at'] >= summary_ttl:
+            summary_cache['data'] = build_dashboard_summary()
+            summary_cache['computed_at'] = time.monotonic()
+        return summary_cache['data']
+
+# Everything the home dashboard shows, in one request
+@dashboard_bp.route('/dashboard/summary', methods=['GET'])
+def get_dashboard_summary():
+    try:
+        return jsonify(get_cached_summary())
+    except Exception as e:
+        print(f"Error in dashboard summary: {str(e)}")
+        return jsonify({'error': str(e)}), 500
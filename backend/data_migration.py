@@ -4,6 +4,8 @@ from bson import ObjectId
 import os
 from dotenv import load_dotenv
 
+from change_stamps import bump_stamps
+
 # Load environment variables (same as your app.py)
 load_dotenv()
 
@@ -58,6 +60,10 @@ def migrate_data():
                 else:
                     print(f"   ❌ Category '{service['category']}' not found for service '{service['service_name']}'")
         
+        # Cached listings (ETags) must not keep showing the old links
+        if products_updated or services_updated:
+            bump_stamps(db.counters, ['products', 'service_type'])
+        
         print(f"\n🎉 Migration Completed!")
         print(f"   Products updated: {products_updated}")
         print(f"   Service Types updated: {services_updated}")
@@ -0,0 +1,151 @@
+# db_indexes.py
+from pymongo import MongoClient, IndexModel, ASCENDING, DESCENDING, TEXT
+from pymongo.errors import OperationFailure
+import os
+import sys
+from dotenv import load_dotenv
+
+ACTIVE = {'is_archived': False}
+ARCHIVED = {'is_archived': True}
+
+# Same fields as the transactions search box
+TRANSACTION_SEARCH_FIELDS = [
+    'customer_name', 'queue_number', 'transaction_id', 'service_type',
+    'paper_type', 'size_type', 'supply_type', 'product_name'
+]
+
+# Every index the blueprints' queries rely on, by collection. Active listings
+# filter on is_archived: False so they can use the partial indexes.
+INDEXES = {
+    'transactions': [
+        IndexModel([('created_at', DESCENDING)],
+                   name='active_created_at', partialFilterExpression=ACTIVE),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING)],
+                   name='active_status_created_at', partialFilterExpression=ACTIVE),
+        IndexModel([('service_type', ASCENDING), ('created_at', DESCENDING)],
+                   name='active_service_type_created_at', partialFilterExpression=ACTIVE),
+        IndexModel([('archived_at', DESCENDING)],
+                   name='archived_archived_at', partialFilterExpression=ARCHIVED),
+        IndexModel([('date', ASCENDING), ('status', ASCENDING)], name='date_status'),
+        # CSV/NDJSON exports stream in (date, _id) order; without it the first
+        # batch waits on an in-memory sort. Not partial: exports include archived.
+        IndexModel([('date', ASCENDING), ('_id', ASCENDING)], name='date_id'),
+        IndexModel([('service_type', ASCENDING), ('is_archived', ASCENDING)], name='service_type_is_archived'),
+        # Search box: is_archived is an equality prefix, so every $text query
+        # must filter on it. No language so names and ids are not stemmed.
+        IndexModel([('is_archived', ASCENDING)] + [(field, TEXT) for field in TRANSACTION_SEARCH_FIELDS],
+                   name='search_text', default_language='none',
+                   weights={'transaction_id': 10, 'queue_number': 10, 'customer_name': 5}),
+    ],
+    'users': [
+        IndexModel([('username', ASCENDING)], name='username'),
+        IndexModel([('group_id', ASCENDING), ('is_archived', ASCENDING)], name='group_id_is_archived'),
+    ],
+    'staffs': [
+        IndexModel([('user_id', ASCENDING)], name='user_id'),
+    ],
+    'service_type': [
+        IndexModel([('service_name', ASCENDING)], name='service_name'),
+        IndexModel([('category_id', ASCENDING)], name='category_id'),
+    ],
+    'products': [
+        IndexModel([('is_archived', ASCENDING), ('created_at', ASCENDING)], name='is_archived_created_at'),
+        IndexModel([('category_id', ASCENDING), ('is_archived', ASCENDING)], name='category_id_is_archived'),
+        IndexModel([('product_name', ASCENDING)], name='product_name'),
+    ],
+    'categories': [
+        IndexModel([('name', ASCENDING)], name='name'),
+    ],
+    'groups': [
+        IndexModel([('group_name', ASCENDING)], name='group_name'),
+    ],
+    'schedule': [
+        IndexModel([('staff_id', ASCENDING)], name='staff_id'),
+    ],
+    'stock_movements': [
+        IndexModel([('product_id', ASCENDING), ('at', ASCENDING)], name='product_id_at'),
+    ],
+    'daily_sales': [
+        IndexModel([('date', ASCENDING), ('service_type', ASCENDING)],
+                   name='date_service_type', unique=True),
+    ],
+}
+
+def ensure_indexes(db):
+    """Backfill is_archived, then create every declared index; existing ones are left untouched"""
+    # Listings filter on is_archived: False, so legacy rows must have the flag first
+    backfilled = backfill_archive_flags(db)
+    if backfilled:
+        print(f"✅ Set is_archived on {backfilled} legacy transaction(s)")
+
+    for collection_name, models in INDEXES.items():
+        try:
+            db[collection_name].create_indexes(models)
+        except OperationFailure as e:
+            # Usually an older index with the same keys but different options
+            print(f"⚠️ Could not create indexes on {collection_name}: {e}")
+
+def backfill_archive_flags(db):
+    """Give legacy transactions an explicit is_archived so the partial indexes cover them"""
+    result = db['transactions'].update_many(
+        {'is_archived': {'$exists': False}},
+        {'$set': {'is_archived': False}}
+    )
+    return result.modified_count
+
+def index_report(db):
+    """Compare declared indexes with what the server has, per collection"""
+    report = {}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        declared = {model.document['name'] for model in models}
+        existing = {index['name'] for index in collection.list_indexes()} - {'_id_'}
+
+        # $indexStats is not available on every Atlas tier
+        try:
+            usage = {
+                stats['name']: stats['accesses']['ops']
+                for stats in collection.aggregate([{'$indexStats': {}}])
+            }
+        except OperationFailure:
+            usage = None
+
+        report[collection_name] = {
+            'missing': sorted(declared - existing),
+            'undeclared': sorted(existing - declared),
+            'unused': sorted(
+                name for name in existing if usage is not None and usage.get(name, 0) == 0
+            ) if usage is not None else None
+        }
+    return report
+
+def print_index_report(db):
+    for collection_name, entry in index_report(db).items():
+        print(f"📁 {collection_name}")
+        print(f"   Missing: {', '.join(entry['missing']) or '-'}")
+        print(f"   Not declared: {', '.join(entry['undeclared']) or '-'}")
+        if entry['unused'] is None:
+            print("   Unused since restart: (index stats unavailable)")
+        else:
+            print(f"   Unused since restart: {', '.join(entry['unused']) or '-'}")
+
+if __name__ == "__main__":
+    load_dotenv()
+    MONGO_URI = os.getenv("MONGO_URI")
+    if not MONGO_URI:
+        raise ValueError("MONGO_URI not set in .env")
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command not in ("create", "report"):
+        print("Usage: python db_indexes.py [create|report]")
+        sys.exit(1)
+
+    client = MongoClient(MONGO_URI)
+    try:
+        db = client["CopyCornerSystem"]
+        if command == "create":
+            print("🔄 Backfilling is_archived and creating indexes...")
+            ensure_indexes(db)
+        print_index_report(db)
+    finally:
+        client.close()
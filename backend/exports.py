@@ -0,0 +1,96 @@
+from flask import Response, current_app, request, stream_with_context
+from datetime import datetime
+import csv
+import io
+
+from json_provider import encode_mongo_value
+
+# Documents fetched from MongoDB per round trip while streaming
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+class InvalidExport(ValueError):
+    pass
+
+def get_export_format():
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        raise InvalidExport(f"Unsupported format '{export_format}'. Use csv or ndjson")
+    return export_format
+
+def date_range_filter(required=False):
+    """Condition on the YYYY-MM-DD `date` field from ?start_date=&end_date="""
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    if required and (not start_date or not end_date):
+        raise InvalidExport('Start date and end date are required')
+
+    condition = {}
+    for op, value in (('$gte', start_date), ('$lte', end_date)):
+        if not value:
+            continue
+        try:
+            datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            raise InvalidExport('Invalid date format. Use YYYY-MM-DD')
+        condition[op] = value
+    return {'date': condition} if condition else {}
+
+def csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    # ObjectId, datetime and the rest: same text as the JSON responses
+    return encode_mongo_value(value)
+
+def stream_export(cursor, fields, export_format, filename):
+    """Stream `cursor` as CSV or NDJSON, one row at a time.
+
+    Each row is written as soon as its batch arrives from MongoDB, so the
+    response starts before the query finishes and memory stays flat no matter
+    how many documents match. That holds only when an index serves the
+    cursor's sort; the transaction exports rely on date_id in db_indexes.py.
+    """
+    cursor = cursor.batch_size(EXPORT_BATCH_SIZE)
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        def flush():
+            data = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return data
+
+        writer.writerow(fields)
+        yield flush()
+        for doc in cursor:
+            writer.writerow([csv_value(doc.get(field)) for field in fields])
+            yield flush()
+
+    def generate_ndjson():
+        for doc in cursor:
+            yield current_app.json.dumps({field: doc.get(field) for field in fields}) + '\n'
+
+    def generate():
+        try:
+            yield from (generate_csv() if export_format == 'csv' else generate_ndjson())
+        finally:
+            # Release the server-side cursor if the client disconnects early
+            cursor.close()
+
+    extension = 'csv' if export_format == 'csv' else 'ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}.{extension}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
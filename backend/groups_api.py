@@ -1,9 +1,13 @@
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient
+from pymongo import MongoClient, DESCENDING
 from bson import ObjectId
 from datetime import datetime
 import os
 
+from reference_cache import invalidate_groups
+from change_stamps import bump, conditional_get
+from pagination import paginate, InvalidCursor
+
 # Create Blueprint for groups routes
 groups_bp = Blueprint('groups', __name__)
 
@@ -18,23 +22,15 @@ def init_groups_db(mongo_collection, mongo_users_collection=None):
     if mongo_users_collection is not None:
         users_collection = mongo_users_collection
 
-# Helper to convert ObjectId to string
-def serialize_doc(doc):
-    if doc:
-        doc['_id'] = str(doc['_id'])
-    return doc
-
 def is_protected_role(group_name):
     protected_roles = ['Administrator', 'Staff Member']
     return group_name in protected_roles
 
 # Get all groups - UPDATED WITH SEARCH
 @groups_bp.route('/groups', methods=['GET'])
+@conditional_get('groups')
 def get_groups():
     try:
-        # Get pagination parameters from query string
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
         search = request.args.get('search', '').strip()
         
         # Base query for non-archived groups
@@ -77,47 +73,24 @@ def get_groups():
             
             query['$or'] = search_conditions
         
-        # Calculate skip value
-        skip = (page - 1) * per_page
-        
-        # Get total count for pagination info (WITH SEARCH FILTER)
-        total_groups = groups_collection.count_documents(query)
-        
-        # Calculate total pages
-        total_pages = (total_groups + per_page - 1) // per_page  # Ceiling division
-        
-        # If requested page is beyond available pages, go to last page
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        # Get paginated groups (ALREADY FILTERED BY SEARCH)
-        groups_cursor = groups_collection.find(query).skip(skip).limit(per_page)
-        groups = list(groups_cursor)
-        
-        serialized_groups = [serialize_doc(group) for group in groups]
+        groups, pagination = paginate(groups_collection, query, 'total_groups')
         
         # Return pagination info along with groups
         return jsonify({
-            'groups': serialized_groups,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_groups': total_groups,
-                'total_pages': total_pages
-            }
+            'groups': groups,
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 # GET ARCHIVED GROUPS - UPDATED WITH SEARCH
 @groups_bp.route('/groups/archived', methods=['GET'])
+@conditional_get('groups')
 def get_archived_groups():
     try:
-        # Get pagination parameters from query string
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
         search = request.args.get('search', '').strip()
         
         # Base query for archived groups
@@ -160,46 +133,26 @@ def get_archived_groups():
             
             query['$or'] = search_conditions
         
-        # Calculate skip value
-        skip = (page - 1) * per_page
-        
-        # Get total count for pagination info (WITH SEARCH FILTER)
-        total_groups = groups_collection.count_documents(query)
-        
-        # Calculate total pages
-        total_pages = (total_groups + per_page - 1) // per_page
-        
-        # If requested page is beyond available pages, go to last page
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        # Get paginated archived groups (ALREADY FILTERED BY SEARCH)
-        groups_cursor = groups_collection.find(query).sort("archived_at", -1).skip(skip).limit(per_page)
-        groups = list(groups_cursor)
-        
-        serialized_groups = [serialize_doc(group) for group in groups]
+        groups, pagination = paginate(groups_collection, query, 'total_groups', 'archived_at', DESCENDING)
         
         return jsonify({
-            'groups': serialized_groups,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_groups': total_groups,
-                'total_pages': total_pages
-            }
+            'groups': groups,
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 # Get single group by ID
 @groups_bp.route('/groups/<group_id>', methods=['GET'])
+@conditional_get('groups')
 def get_group(group_id):
     try:
         group = groups_collection.find_one({'_id': ObjectId(group_id)})
         if group:
-            return jsonify(serialize_doc(group))
+            return jsonify(group)
         return jsonify({'error': 'Group not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -233,6 +186,8 @@ def create_group():
         }
         
         result = groups_collection.insert_one(new_group)
+        invalidate_groups()
+        bump('groups')
         new_group['_id'] = str(result.inserted_id)
         return jsonify(new_group), 201
     except Exception as e:
@@ -274,6 +229,8 @@ def update_group(group_id):
             {'_id': ObjectId(group_id)},
             {'$set': update_data}
         )
+        invalidate_groups()
+        bump('groups')
         
         if result.matched_count:
             return jsonify({'message': 'Role updated successfully'})
@@ -328,6 +285,8 @@ def archive_group(group_id):
                 'updated_at': datetime.utcnow()
             }}
         )
+        invalidate_groups()
+        bump('groups')
         
         if result.modified_count:
             return jsonify({'message': 'Role archived successfully'})
@@ -366,6 +325,8 @@ def restore_group(group_id):
                 'updated_at': datetime.utcnow()
             }}
         )
+        invalidate_groups()
+        bump('groups')
         
         if result.modified_count:
             return jsonify({'message': 'Role restored successfully'})
@@ -379,6 +340,8 @@ def restore_group(group_id):
 def delete_group(group_id):
     try:
         result = groups_collection.delete_one({'_id': ObjectId(group_id)})
+        invalidate_groups()
+        bump('groups')
         if result.deleted_count:
             return jsonify({'message': 'Role deleted successfully'})
         return jsonify({'error': 'Role not found'}), 404
@@ -4,6 +4,8 @@ from bson import ObjectId
 from datetime import datetime
 import os
 
+from change_stamps import conditional_get
+
 # Create Blueprint for inventory reports
 inventory_report_bp = Blueprint('inventory_report', __name__)
 
@@ -17,12 +19,6 @@ def init_inventory_report_db(products_coll, categories_coll):
     products_collection = products_coll
     categories_collection = categories_coll
 
-# Helper to convert ObjectId to string
-def serialize_doc(doc):
-    if doc and '_id' in doc:
-        doc['_id'] = str(doc['_id'])
-    return doc
-
 # Helper function to determine stock status
 def get_stock_status(stock_quantity, minimum_stock):
     stock_num = int(stock_quantity)
@@ -37,6 +33,7 @@ def get_stock_status(stock_quantity, minimum_stock):
 
 # Inventory Report Endpoint
 @inventory_report_bp.route('/reports/inventory', methods=['GET'])
+@conditional_get('products', 'categories')
 def get_inventory_report():
     try:
         print(f"=== INVENTORY REPORT DEBUG ===")
@@ -45,6 +42,13 @@ def get_inventory_report():
         products = list(products_collection.find({'is_archived': {'$ne': True}}))
         print(f"Found {len(products)} active products")
         
+        # Resolve every category on the report with one query
+        category_ids = {ObjectId(p['category_id']) for p in products if p.get('category_id')}
+        category_names = {}
+        if category_ids:
+            for category in categories_collection.find({'_id': {'$in': list(category_ids)}}, {'name': 1}):
+                category_names[category['_id']] = category.get('name', 'Uncategorized')
+        
         # Initialize counters
         low_stock_items = []
         out_of_stock_items = []
@@ -62,9 +66,7 @@ def get_inventory_report():
             # Get category name
             category_name = 'Uncategorized'
             if product.get('category_id'):
-                category = categories_collection.find_one({'_id': ObjectId(product['category_id'])})
-                if category:
-                    category_name = category.get('name', 'Uncategorized')
+                category_name = category_names.get(ObjectId(product['category_id']), 'Uncategorized')
             elif product.get('category'):
                 category_name = product['category']
             
@@ -97,7 +99,7 @@ def get_inventory_report():
         
         # Calculate stock status summary
         stock_status = {
-            'inStock': len([p for p in current_stock if p['status'] == 'In Stock']),
+            'inStock': len(current_stock) - len(low_stock_items) - len(out_of_stock_items),
             'lowStock': len(low_stock_items),
             'outOfStock': len(out_of_stock_items)
         }
@@ -0,0 +1,65 @@
+from flask.json.provider import DefaultJSONProvider
+from bson import ObjectId, Decimal128
+from datetime import datetime, date
+import base64
+import os
+
+# orjson is optional; without it the standard library encoder is used
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def encode_mongo_value(o):
+    """Encode the non-JSON types found in MongoDB documents"""
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, datetime):
+        # PyMongo returns naive datetimes in UTC
+        return o.isoformat() + 'Z' if o.tzinfo is None else o.isoformat()
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, bytes):
+        return base64.b64encode(o).decode('ascii')
+    if isinstance(o, Decimal128):
+        return str(o)
+    return DefaultJSONProvider.default(o)
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """jsonify() that accepts raw MongoDB documents"""
+    default = staticmethod(encode_mongo_value)
+
+class OrjsonProvider(MongoJSONProvider):
+    """Same output as MongoJSONProvider, encoded by orjson.
+
+    orjson encodes plain values and datetimes in C and only calls
+    encode_mongo_value for the types it does not know, such as ObjectId.
+    """
+
+    def _options(self, sort_keys):
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        option = self._options(kwargs.get('sort_keys', self.sort_keys))
+        return orjson.dumps(obj, default=encode_mongo_value, option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self._options(self.sort_keys)
+        # Pretty-print in debug mode, like the default provider
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        body = orjson.dumps(obj, default=encode_mongo_value, option=option) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+def init_json_provider(app):
+    """Install the MongoDB-aware JSON provider on the app from app.py"""
+    # JSON_ENCODER=stdlib forces the standard library encoder even if orjson is installed
+    use_orjson = orjson is not None and os.getenv("JSON_ENCODER", "orjson").lower() != "stdlib"
+    app.json = OrjsonProvider(app) if use_orjson else MongoJSONProvider(app)
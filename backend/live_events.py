@@ -0,0 +1,168 @@
+# live_events.py
+from flask import Response, current_app, jsonify, stream_with_context
+from collections import deque
+import itertools
+import os
+import queue
+import threading
+import time
+
+# Comment line sent on idle connections so proxies keep them open
+HEARTBEAT_SECONDS = 15
+# Streams end after this long and EventSource reconnects with Last-Event-ID,
+# so no worker thread is held by one client forever
+MAX_STREAM_SECONDS = 300
+# Seconds a client refused for too many open streams is asked to wait
+STREAM_RETRY_SECONDS = 60
+# Events a client may fall behind by before it is disconnected
+SUBSCRIBER_QUEUE_SIZE = 100
+# Events kept for clients resuming with Last-Event-ID
+RECENT_EVENTS = 200
+
+class Subscription:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = False
+
+class EventHub:
+    """Process-local fan-out of events to Server-Sent Events clients.
+
+    Events only reach clients connected to the same process, which holds for
+    the single gunicorn worker this app runs with.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._open_streams = 0
+        self._listeners = []
+        self._recent = deque(maxlen=RECENT_EVENTS)
+        self._ids = itertools.count(1)
+        # Ids from before a restart are not resumable
+        self._boot = format(int(time.time()), 'x')
+
+    def add_listener(self, callback):
+        """Call callback(event, data) in-process for every published event"""
+        self._listeners.append(callback)
+
+    def publish(self, event, data):
+        # Serialized once here, with the app's JSON provider, for every client
+        message = (next(self._ids), event, data, current_app.json.dumps(data))
+        with self._lock:
+            self._recent.append(message)
+            for subscription in list(self._subscriptions):
+                try:
+                    subscription.queue.put_nowait(message)
+                except queue.Full:
+                    # The client stopped reading; its stream ends and it reconnects
+                    subscription.dropped = True
+                    self._subscriptions.discard(subscription)
+
+        for callback in self._listeners:
+            try:
+                callback(event, data)
+            except Exception as e:
+                print(f"Error in {event} event listener: {e}")
+
+    def event_id(self, seq):
+        return f"{self._boot}-{seq}"
+
+    def subscribe(self, last_event_id=None):
+        """(subscription, backlog, complete): backlog holds the events after
+        last_event_id, complete is False when some of them are no longer kept."""
+        subscription = Subscription()
+        with self._lock:
+            backlog, complete = self._replay(last_event_id)
+            self._subscriptions.add(subscription)
+        return subscription, backlog, complete
+
+    def max_streams(self):
+        # Every open stream holds a gunicorn thread (--threads 16 in render.yaml);
+        # the rest must stay free for ordinary API requests
+        return int(os.getenv("MAX_EVENT_STREAMS", "8"))
+
+    def _open_stream(self):
+        with self._lock:
+            if self._open_streams >= self.max_streams():
+                return False
+            self._open_streams += 1
+            return True
+
+    def _close_stream(self):
+        with self._lock:
+            self._open_streams -= 1
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def _replay(self, last_event_id):
+        if not last_event_id:
+            return [], True
+        boot, _, seq = last_event_id.partition('-')
+        if boot != self._boot or not seq.isdigit():
+            return [], False
+        seq = int(seq)
+        backlog = [message for message in self._recent if message[0] > seq]
+        oldest = self._recent[0][0] if self._recent else seq + 1
+        return backlog, oldest <= seq + 1
+
+    def stream(self, last_event_id=None, accept=None):
+        """text/event-stream response of every event from now on.
+
+        accept(event, data) can filter which events this client receives.
+        Past MAX_EVENT_STREAMS open streams in this process the answer is a
+        503 with Retry-After, and clients fall back to polling.
+        """
+        if not self._open_stream():
+            response = jsonify({'error': 'Too many live streams open, try again later'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(STREAM_RETRY_SECONDS)
+            return response
+
+        subscription, backlog, complete = self.subscribe(last_event_id)
+        closed = threading.Event()
+
+        def close():
+            # The server closes the response whether or not the stream ever started
+            if not closed.is_set():
+                closed.set()
+                self.unsubscribe(subscription)
+                self._close_stream()
+
+        def format_message(message):
+            seq, event, _, payload = message
+            return f"id: {self.event_id(seq)}\nevent: {event}\ndata: {payload}\n\n"
+
+        def generate():
+            try:
+                yield "retry: 3000\n\n"
+                if not complete:
+                    # Events were missed; the client should reload its list
+                    yield "event: resync\ndata: {}\n\n"
+                for message in backlog:
+                    if accept is None or accept(message[1], message[2]):
+                        yield format_message(message)
+
+                deadline = time.monotonic() + MAX_STREAM_SECONDS
+                while not subscription.dropped and time.monotonic() < deadline:
+                    try:
+                        message = subscription.queue.get(timeout=HEARTBEAT_SECONDS)
+                    except queue.Empty:
+                        yield ": keep-alive\n\n"
+                        continue
+                    if accept is None or accept(message[1], message[2]):
+                        yield format_message(message)
+            finally:
+                close()
+
+        response = Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        response.call_on_close(close)
+        return response
+
+# Transaction created / status_changed / archived events for queue boards
+transaction_events = EventHub()
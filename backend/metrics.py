@@ -0,0 +1,199 @@
+# metrics.py
+from flask import Response, g, request, jsonify
+from pymongo import monitoring
+import hmac
+import os
+import threading
+import time
+
+# Histogram buckets, in the units of each metric
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COMMAND_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{format_labels(self.label_names, labels)} {format_number(value)}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets) + (float('inf'),)
+        # labels -> [count per bucket (not cumulative), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * len(self.buckets), 0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (bucket_counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    le = format_labels(self.label_names, labels, [('le', format_number(bound))])
+                    lines.append(f'{self.name}_bucket{le} {cumulative}')
+                label_text = format_labels(self.label_names, labels)
+                lines.append(f'{self.name}_sum{label_text} {format_number(float(total))}')
+                lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Time to build the response, by route',
+    ('method', 'route', 'status'))
+response_bytes = Counter(
+    'http_response_bytes_total', 'Response body bytes sent, by route (streamed bodies excluded)',
+    ('method', 'route'))
+request_commands = Histogram(
+    'mongodb_commands_per_request', 'MongoDB commands issued while handling one request',
+    ('method', 'route'), COUNT_BUCKETS)
+request_documents = Histogram(
+    'mongodb_documents_per_request', 'Documents returned by MongoDB while handling one request',
+    ('method', 'route'), COUNT_BUCKETS)
+command_duration = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command round trip time, by collection and command',
+    ('collection', 'command'), COMMAND_BUCKETS)
+command_documents = Counter(
+    'mongodb_documents_returned_total', 'Documents returned by MongoDB, by collection and command',
+    ('collection', 'command'))
+command_failures = Counter(
+    'mongodb_command_failures_total', 'Failed MongoDB commands, by collection and command',
+    ('collection', 'command'))
+
+ALL_METRICS = [request_duration, response_bytes, request_commands, request_documents,
+               command_duration, command_documents, command_failures]
+
+# Commands and documents of the request being handled on this thread. PyMongo
+# calls the listener on the thread that ran the command, so no locking is needed.
+request_state = threading.local()
+
+def returned_documents(reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+    return 0
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command and charges it to the current request"""
+
+    def __init__(self):
+        # request_id -> collection name, from the started event
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == 'getMore':
+            collection = event.command.get('collection')
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ''
+        if getattr(request_state, 'active', False):
+            request_state.commands += 1
+
+    def succeeded(self, event):
+        labels = (self._collections.pop(event.request_id, ''), event.command_name)
+        command_duration.observe(event.duration_micros / 1e6, labels)
+        documents = returned_documents(event.reply)
+        if documents:
+            command_documents.inc(labels, documents)
+            if getattr(request_state, 'active', False):
+                request_state.documents += documents
+
+    def failed(self, event):
+        labels = (self._collections.pop(event.request_id, ''), event.command_name)
+        command_duration.observe(event.duration_micros / 1e6, labels)
+        command_failures.inc(labels)
+
+command_metrics = CommandMetrics()
+
+def route_label():
+    # The rule, e.g. /products/<product_id>, keeps one series per route
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    request_state.active = True
+    request_state.commands = 0
+    request_state.documents = 0
+
+def finish_request_metrics(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+
+    labels = (request.method, route_label())
+    request_duration.observe(time.perf_counter() - started, labels + (str(response.status_code),))
+    request_commands.observe(request_state.commands, labels)
+    request_documents.observe(request_state.documents, labels)
+    # Commands a streamed body runs later are still timed per command
+    request_state.active = False
+
+    if not response.is_streamed and response.content_length is not None:
+        response_bytes.inc(labels, response.content_length)
+    return response
+
+def render_metrics():
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def init_metrics(app):
+    """Install the request hooks and the /metrics endpoint from app.py.
+
+    Pass command_metrics to MongoClient(event_listeners=...) for the MongoDB side.
+    """
+    # /metrics names routes and query shapes, so it is closed unless METRICS_TOKEN
+    # is set (sent as a bearer token) or METRICS_PUBLIC=true opens it to anyone
+    token = os.getenv("METRICS_TOKEN", "")
+    public = os.getenv("METRICS_PUBLIC", "false").lower() in ("1", "true", "yes")
+
+    app.before_request(start_request_metrics)
+    app.after_request(finish_request_metrics)
+
+    @app.route("/metrics")
+    def metrics():
+        if token:
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+                return jsonify({'error': 'Unauthorized'}), 401
+        elif not public:
+            return jsonify({'error': 'Metrics are disabled; set METRICS_TOKEN or METRICS_PUBLIC=true'}), 403
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,190 @@
+from flask import request
+from pymongo import ASCENDING, DESCENDING
+from bson import json_util
+import base64
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(doc, sort_field):
+    """Opaque cursor pointing just past `doc` in (sort_field, _id) order"""
+    value = doc.get(sort_field) if sort_field != '_id' else doc['_id']
+    raw = json_util.dumps([value, doc['_id']])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        value, doc_id = json_util.loads(raw)
+        return value, doc_id
+    except Exception:
+        raise InvalidCursor('Invalid cursor')
+
+def keyset_filter(sort_field, direction, value, doc_id):
+    """Condition matching every document after (value, doc_id) in the sort order"""
+    if sort_field == '_id':
+        return {'_id': {'$lt' if direction == DESCENDING else '$gt': doc_id}}
+
+    # Missing/null sort values come last when descending and first when ascending
+    if direction == DESCENDING:
+        if value is None:
+            return {sort_field: None, '_id': {'$lt': doc_id}}
+        return {'$or': [
+            {sort_field: {'$lt': value}},
+            {sort_field: value, '_id': {'$lt': doc_id}},
+            {sort_field: None}
+        ]}
+
+    if value is None:
+        return {'$or': [
+            {sort_field: None, '_id': {'$gt': doc_id}},
+            {sort_field: {'$ne': None}}
+        ]}
+    return {'$or': [
+        {sort_field: {'$gt': value}},
+        {sort_field: value, '_id': {'$gt': doc_id}}
+    ]}
+
+# count=estimated counts at most this many matches of a filtered query
+ESTIMATED_COUNT_LIMIT = 10000
+
+def count_matches(collection, query, count_mode):
+    """Total for the pagination block and whether it is approximate.
+
+    exact counts every match and none skips counting. estimated reads the
+    collection metadata when there is no filter and otherwise stops counting
+    at ESTIMATED_COUNT_LIMIT, in which case the total is only a lower bound.
+    """
+    if count_mode == 'none':
+        return None, False
+    if count_mode == 'estimated':
+        if not query:
+            return collection.estimated_document_count(), True
+        total = collection.count_documents(query, limit=ESTIMATED_COUNT_LIMIT)
+        return total, total >= ESTIMATED_COUNT_LIMIT
+    return collection.count_documents(query), False
+
+def count_fields(total_key, total, approximate, per_page, count_mode):
+    """total/total_pages for the pagination block; estimated counts also say if they are approximate"""
+    fields = {
+        total_key: total,
+        'total_pages': (total + per_page - 1) // per_page if total is not None else None
+    }
+    if count_mode == 'estimated':
+        fields['total_approximate'] = approximate
+    return fields
+
+def aggregate_page(collection, query, pipeline, page_stages, count_mode):
+    """Page and total of `pipeline` over the matches of `query`, in one aggregation (see paginate)"""
+    facet = {'docs': page_stages}
+    if count_mode == 'estimated':
+        facet['total'] = [{'$limit': ESTIMATED_COUNT_LIMIT}, {'$count': 'count'}]
+    elif count_mode != 'none':
+        facet['total'] = [{'$count': 'count'}]
+    result = next(collection.aggregate([{'$match': query}] + pipeline + [{'$facet': facet}]))
+
+    if 'total' not in result:
+        return result['docs'], None, False
+    total = result['total'][0]['count'] if result['total'] else 0
+    return result['docs'], total, count_mode == 'estimated' and total >= ESTIMATED_COUNT_LIMIT
+
+def paginate(collection, query, total_key, sort_field=None, direction=ASCENDING, default_per_page=10,
+             pipeline=None, page_pipeline=None):
+    """Fetch one page of `query` and the matching pagination block.
+
+    Offset mode (default) keeps the page/total_pages contract. Passing
+    `after=<cursor>` (empty for the first page) switches to keyset mode,
+    which seeks on (sort_field, _id) and returns `next_cursor`. `count`
+    may be exact, estimated (capped, see count_matches) or none; keyset
+    mode skips it unless asked.
+    Endpoints without a sort order are keyed on _id in keyset mode.
+    Text searches ($text in the query) are ordered by relevance first and
+    only support offset mode.
+
+    `pipeline` (stages run on every match before sorting, e.g. a $lookup to
+    filter on) and `page_pipeline` (stages run on the page's documents only)
+    fetch the page and its count in a single aggregation instead, sorted on
+    (sort_field, _id) in both modes. They do not support text search.
+    """
+    per_page = int(request.args.get('per_page', default_per_page))
+    after = request.args.get('after')
+    relevance = '$text' in query
+    aggregated = pipeline is not None or page_pipeline is not None
+    keyset_field = sort_field or '_id'
+    sort = [(keyset_field, direction)] if keyset_field == '_id' else [(keyset_field, direction), ('_id', direction)]
+
+    if aggregated:
+        pipeline = list(pipeline or []) + [{'$sort': dict(sort)}]
+        page_pipeline = list(page_pipeline or [])
+
+    if after is not None and relevance:
+        raise InvalidCursor('Cursor pagination is not available for text search; use page instead')
+
+    if after is not None:
+        count_mode = request.args.get('count', 'none')
+        condition = None
+        if after:
+            value, doc_id = decode_cursor(after)
+            condition = keyset_filter(keyset_field, direction, value, doc_id)
+
+        # One extra row tells us whether another page exists
+        if aggregated:
+            page_stages = ([{'$match': condition}] if condition else []) + [{'$limit': per_page + 1}]
+            docs, total, approximate = aggregate_page(collection, query, pipeline, page_stages + page_pipeline, count_mode)
+        else:
+            page_query = {'$and': [query, condition]} if condition else query
+            docs = list(collection.find(page_query).sort(sort).limit(per_page + 1))
+            total, approximate = count_matches(collection, query, count_mode)
+        next_cursor = encode_cursor(docs[per_page - 1], keyset_field) if len(docs) > per_page else None
+        docs = docs[:per_page]
+
+        return docs, {
+            'per_page': per_page,
+            'next_cursor': next_cursor,
+            **count_fields(total_key, total, approximate, per_page, count_mode)
+        }
+
+    count_mode = request.args.get('count', 'exact')
+    page = int(request.args.get('page', 1))
+
+    if aggregated:
+        # The count comes with the page, so a page past the end is fetched again
+        docs, total, approximate = aggregate_page(
+            collection, query, pipeline,
+            [{'$skip': (page - 1) * per_page}, {'$limit': per_page}] + page_pipeline, count_mode)
+    else:
+        total, approximate = count_matches(collection, query, count_mode)
+    counts = count_fields(total_key, total, approximate, per_page, count_mode)
+    total_pages = counts['total_pages']
+
+    # If requested page is beyond available pages, go to last page (a capped total has more)
+    clamped = total_pages is not None and not approximate and page > total_pages and total_pages > 0
+    if clamped:
+        page = total_pages
+    skip = (page - 1) * per_page
+
+    if aggregated:
+        if clamped:
+            docs, _, _ = aggregate_page(
+                collection, query, pipeline, [{'$skip': skip}, {'$limit': per_page}] + page_pipeline, 'none')
+        return docs, {
+            'page': page,
+            'per_page': per_page,
+            **counts
+        }
+
+    cursor = collection.find(query)
+    if relevance:
+        sort = [('score', {'$meta': 'textScore'})]
+        if sort_field:
+            sort.append((sort_field, direction))
+        cursor = cursor.sort(sort)
+    elif sort_field:
+        cursor = cursor.sort(sort_field, direction)
+    docs = list(cursor.skip(skip).limit(per_page))
+
+    return docs, {
+        'page': page,
+        'per_page': per_page,
+        **counts
+    }
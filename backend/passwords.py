@@ -0,0 +1,166 @@
+# passwords.py
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pymongo import UpdateOne
+from datetime import datetime
+import atexit
+import base64
+import bcrypt
+import os
+import threading
+import time
+
+# Configured by init_passwords_db from the environment
+# bcrypt cost for new hashes; older hashes are upgraded on the next login
+bcrypt_rounds = 12
+# Logins waiting beyond this are turned away instead of piling up
+password_timeout = 10.0
+# Seconds between writes of batched last_login times
+last_login_flush_interval = 5.0
+
+password_pool = None
+password_slots = None
+
+class PasswordServiceBusy(Exception):
+    pass
+
+def hash_password(password):
+    """Hash a password using bcrypt"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=bcrypt_rounds))
+
+def check_password(plain_password, hashed_password):
+    """Check if a plain password matches the hashed password"""
+    if not hashed_password:
+        return False
+
+    try:
+        # If hashed_password is bytes (from bcrypt)
+        if isinstance(hashed_password, bytes):
+            return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password)
+        # If hashed_password is string (might be from migration)
+        elif isinstance(hashed_password, str):
+            # Try to decode as base64 first (if it was encoded for storage)
+            try:
+                hashed_bytes = base64.b64decode(hashed_password)
+                return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_bytes)
+            except Exception:
+                # If it's not base64, try direct string comparison (for legacy)
+                return hashed_password == plain_password
+        else:
+            return False
+    except Exception as e:
+        print(f"Password check error: {e}")
+        return False
+
+def needs_rehash(hashed_password):
+    """True for base64/plaintext legacy passwords and bcrypt hashes of another cost"""
+    if not isinstance(hashed_password, bytes):
+        return True
+    try:
+        # $2b$12$... - the cost sits between the second and third $
+        return int(hashed_password.split(b'$')[2]) != bcrypt_rounds
+    except (IndexError, ValueError):
+        return True
+
+def _verify(plain_password, hashed_password):
+    if not check_password(plain_password, hashed_password):
+        return False, None
+    # Still on the pool thread, so the upgrade costs the request no extra wait
+    return True, hash_password(plain_password) if needs_rehash(hashed_password) else None
+
+def verify_password(plain_password, hashed_password):
+    """(matches, new_hash) computed on the bounded bcrypt pool.
+
+    new_hash is set when the stored password should be replaced by a hash at
+    bcrypt_rounds. Raises PasswordServiceBusy when too many logins are waiting.
+    """
+    if not password_slots.acquire(timeout=password_timeout):
+        raise PasswordServiceBusy('Too many logins at once. Please try again.')
+    try:
+        future = password_pool.submit(_verify, plain_password, hashed_password)
+        try:
+            return future.result(timeout=password_timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise PasswordServiceBusy('Too many logins at once. Please try again.')
+    finally:
+        password_slots.release()
+
+class LoginRecorder:
+    """Write-behind for login bookkeeping.
+
+    Logins are collected in memory and written by a background thread in one
+    bulk_write every few seconds, so the login request never waits on the
+    write. A crash loses at most the last few seconds of last_login times.
+    """
+
+    def __init__(self):
+        self.collection = None
+        self._lock = threading.Lock()
+        self._last_logins = {}
+        self._rehashes = {}
+        self._thread = None
+
+    def bind(self, users_coll):
+        self.collection = users_coll
+
+    def record(self, user_id, old_hash=None, new_hash=None):
+        with self._lock:
+            self._last_logins[user_id] = datetime.utcnow()
+            if new_hash is not None:
+                self._rehashes[user_id] = (old_hash, new_hash)
+            if self._thread is None:
+                # Started on first use so each gunicorn worker gets its own
+                self._thread = threading.Thread(target=self._run, name='last-login-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(last_login_flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            last_logins, self._last_logins = self._last_logins, {}
+            rehashes, self._rehashes = self._rehashes, {}
+        if not last_logins and not rehashes:
+            return
+
+        operations = [
+            UpdateOne({'_id': user_id}, {'$set': {'last_login': at, 'updated_at': at}})
+            for user_id, at in last_logins.items()
+        ]
+        # Only replace the hash the login was checked against, never a password changed since
+        operations += [
+            UpdateOne({'_id': user_id, 'password': old_hash}, {'$set': {'password': new_hash}})
+            for user_id, (old_hash, new_hash) in rehashes.items()
+        ]
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            print(f"Error saving logins: {e}")
+            # Retried with the next flush unless a newer login replaced them
+            with self._lock:
+                for user_id, at in last_logins.items():
+                    self._last_logins.setdefault(user_id, at)
+                for user_id, rehash in rehashes.items():
+                    self._rehashes.setdefault(user_id, rehash)
+
+login_recorder = LoginRecorder()
+
+def init_passwords_db(users_coll):
+    """Initialize the collection and the bcrypt pool from app.py"""
+    global bcrypt_rounds, password_timeout, last_login_flush_interval, password_pool, password_slots
+    bcrypt_rounds = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    password_timeout = float(os.getenv("PASSWORD_TIMEOUT_SECONDS", "10"))
+    last_login_flush_interval = float(os.getenv("LAST_LOGIN_FLUSH_SECONDS", "5"))
+
+    # bcrypt releases the GIL, so the worker count is the number of cores
+    # logins may use; more would only slow every login down at shift change
+    workers = int(os.getenv("PASSWORD_WORKERS", "2"))
+    password_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+    password_slots = threading.BoundedSemaphore(int(os.getenv("PASSWORD_QUEUE_LIMIT", "32")))
+
+    login_recorder.bind(users_coll)
+
+# Write what is still pending when the worker shuts down
+atexit.register(login_recorder.flush)
@@ -1,42 +1,31 @@
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ReturnDocument, ASCENDING, DESCENDING
 from bson import ObjectId
-from datetime import datetime
+from datetime import datetime, timezone
 import os
 import re
 
+from pagination import paginate, InvalidCursor
+from stock_ledger import record_stock_movement, stock_at
+from change_stamps import bump, conditional_get
+from counters import next_sequence, seed_counter
+
 products_bp = Blueprint('products', __name__)
 
 products_collection = None
 categories_collection = None
 transactions_collection = None
+stock_movements_collection = None
 
 def init_products_db(mongo_collection):
     global products_collection
     products_collection = mongo_collection
 
-def init_products_relationships(categories_coll, transactions_coll):
-    global categories_collection, transactions_collection
+def init_products_relationships(categories_coll, transactions_coll, stock_movements_coll):
+    global categories_collection, transactions_collection, stock_movements_collection
     categories_collection = categories_coll
     transactions_collection = transactions_coll
-
-def serialize_doc(doc):
-    if not doc:
-        return doc
-    
-    serialized = {}
-    for key, value in doc.items():
-        if isinstance(value, ObjectId):
-            serialized[key] = str(value)
-        elif isinstance(value, datetime):
-            serialized[key] = value.isoformat()
-        elif isinstance(value, dict):
-            serialized[key] = serialize_doc(value)
-        elif isinstance(value, list):
-            serialized[key] = [serialize_doc(item) if isinstance(item, dict) else item for item in value]
-        else:
-            serialized[key] = value
-    return serialized
+    stock_movements_collection = stock_movements_coll
 
 def get_stock_status(stock_quantity, minimum_stock):
     stock_num = int(stock_quantity)
@@ -49,37 +38,100 @@ def get_stock_status(stock_quantity, minimum_stock):
     else:
         return "In Stock"
 
+def parse_product_number(product_id):
+    try:
+        return int(str(product_id).split('_')[-1])
+    except (TypeError, ValueError):
+        return 0
+
+def init_product_counter():
+    """Seed the product_id counter from existing products so new ids never collide"""
+    # Lazy numbering never rewrites stored ids, so archived ones stay taken too
+    query = {} if lazy_product_ids() else {'is_archived': {'$ne': True}}
+    highest = max(
+        (parse_product_number(product.get('product_id')) for product in products_collection.find(query, {'product_id': 1})),
+        default=0
+    )
+    seed_counter('product_id', max(highest, products_collection.count_documents(query)))
+
 def generate_product_id():
-    products = list(products_collection.find({"is_archived": {"$ne": True}}).sort("created_at", 1))
-    if not products:
-        return "PROD_001"
-    
-    count = products_collection.count_documents({"is_archived": {"$ne": True}})
-    return f"PROD_{count + 1:03d}"
+    return f"PROD_{next_sequence('product_id'):03d}"
+
+def lazy_product_ids():
+    # Set LAZY_PRODUCT_IDS=true to number products at read time instead of on archive/restore
+    return os.getenv("LAZY_PRODUCT_IDS", "false").lower() in ("1", "true", "yes")
 
 def renumber_products():
     try:
-        products = list(products_collection.find({"is_archived": {"$ne": True}}).sort("created_at", 1))
-        
+        products = products_collection.find(
+            {"is_archived": {"$ne": True}},
+            {'product_id': 1}
+        ).sort("created_at", 1)
+        
+        # Only rewrite the products whose number actually changes
+        operations = []
+        index = 0
         for index, product in enumerate(products, 1):
             new_product_id = f"PROD_{index:03d}"
-            products_collection.update_one(
-                {'_id': product['_id']},
-                {'$set': {'product_id': new_product_id}}
-            )
+            if product.get('product_id') != new_product_id:
+                operations.append(UpdateOne(
+                    {'_id': product['_id']},
+                    {'$set': {'product_id': new_product_id}}
+                ))
+        
+        if operations:
+            products_collection.bulk_write(operations, ordered=False)
+            bump('products')
+        
+        # Only ever forward: a product created meanwhile may already hold a higher id
+        seed_counter('product_id', index)
         
         return True
     except Exception as e:
         print(f"Error renumbering products: {e}")
         return False
 
+def rank_pipeline():
+    """Active products numbered by created_at rank, the order PROD_ ids are shown in"""
+    return [
+        {'$match': {'is_archived': {'$ne': True}}},
+        {'$setWindowFields': {
+            'sortBy': {'created_at': 1},
+            'output': {'rank': {'$documentNumber': {}}}
+        }}
+    ]
+
+def display_id_matches(regex_pattern):
+    """_ids of the active products whose displayed (rank) id matches the search"""
+    total = products_collection.count_documents({'is_archived': {'$ne': True}})
+    ranks = [rank for rank in range(1, total + 1) if regex_pattern.match(f"PROD_{rank:03d}")]
+    if not ranks:
+        return []
+    pipeline = rank_pipeline() + [{'$match': {'rank': {'$in': ranks}}}, {'$project': {'_id': 1}}]
+    return [row['_id'] for row in products_collection.aggregate(pipeline)]
+
+def attach_display_ids(products):
+    """Number a page of active products by created_at rank, computed in MongoDB"""
+    if not products:
+        return products
+    
+    ids = [product['_id'] for product in products]
+    pipeline = rank_pipeline() + [
+        {'$match': {'_id': {'$in': ids}}},
+        {'$project': {'rank': 1}}
+    ]
+    ranks = {row['_id']: row['rank'] for row in products_collection.aggregate(pipeline)}
+    
+    for product in products:
+        if product['_id'] in ranks:
+            product['product_id'] = f"PROD_{ranks[product['_id']]:03d}"
+    return products
+
 @products_bp.route('/products', methods=['GET'])
+@conditional_get('products', 'categories')
 def get_products():
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
         search = request.args.get('search', '').strip()
-        skip = (page - 1) * per_page
         
         # Build query with search functionality
         query = {'is_archived': {'$ne': True}}
@@ -87,21 +139,21 @@ def get_products():
         if search:
             # Create a regex pattern for case-insensitive search
             regex_pattern = re.compile(f'.*{re.escape(search)}.*', re.IGNORECASE)
+            # Match the id the list shows: with lazy ids that is the rank, not the stored id
+            if lazy_product_ids():
+                id_condition = {'_id': {'$in': display_id_matches(regex_pattern)}}
+            else:
+                id_condition = {'product_id': regex_pattern}
             query['$or'] = [
                 {'product_name': regex_pattern},
-                {'product_id': regex_pattern},
+                id_condition,
                 {'category': regex_pattern}
             ]
         
-        total_products = products_collection.count_documents(query)
-        total_pages = (total_products + per_page - 1) // per_page
+        products, pagination = paginate(products_collection, query, 'total_products', 'created_at', ASCENDING)
         
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        products_cursor = products_collection.find(query).sort("created_at", 1).skip(skip).limit(per_page)
-        products = list(products_cursor)
+        if lazy_product_ids():
+            attach_display_ids(products)
         
         for product in products:
             # Handle both old 'category' field and new 'category_id' relationship
@@ -114,17 +166,12 @@ def get_products():
             else:
                 product['category_name'] = 'Uncategorized'
         
-        serialized_products = [serialize_doc(product) for product in products]
-        
         return jsonify({
-            'products': serialized_products,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_products': total_products,
-                'total_pages': total_pages
-            }
+            'products': products,
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -133,10 +180,13 @@ def get_product(product_id):
     try:
         product = products_collection.find_one({'_id': ObjectId(product_id)})
         if product:
+            if lazy_product_ids() and not product.get('is_archived'):
+                attach_display_ids([product])
+            
             # Handle both old 'category' field and new 'category_id' relationship
             if product.get('category_id'):
                 category = categories_collection.find_one({'_id': ObjectId(product['category_id'])})
-                product['category_data'] = serialize_doc(category) if category else None
+                product['category_data'] = category
                 product['category_name'] = category['name'] if category else 'Unknown'
             elif product.get('category'):
                 # Fallback to old category field
@@ -151,7 +201,7 @@ def get_product(product_id):
             })
             product['transaction_count'] = transaction_count
             
-            return jsonify(serialize_doc(product))
+            return jsonify(product)
         return jsonify({'error': 'Product not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -191,6 +241,12 @@ def create_product():
         }
         
         result = products_collection.insert_one(new_product)
+        bump('products')
+        record_stock_movement(result.inserted_id, new_product['stock_quantity'], new_product['stock_quantity'], 'initial_stock')
+        
+        # The counter never moves back after an archive, so close any gap it left
+        if not lazy_product_ids():
+            renumber_products()
         
         inserted_product = products_collection.find_one({'_id': result.inserted_id})
         
@@ -203,8 +259,7 @@ def create_product():
         elif inserted_product.get('category'):
             inserted_product['category_name'] = inserted_product['category']
         
-        serialized_product = serialize_doc(inserted_product)
-        return jsonify(serialized_product), 201
+        return jsonify(inserted_product), 201
         
     except Exception as e:
         print(f"Error creating product: {str(e)}")
@@ -241,20 +296,31 @@ def update_product(product_id):
             'updated_at': datetime.utcnow()
         }
         
-        result = products_collection.update_one(
+        # BEFORE image gives the stock ledger the quantity this edit replaced
+        previous_product = products_collection.find_one_and_update(
             {'_id': ObjectId(product_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count:
+        if previous_product:
+            bump('products')
+            old_stock = previous_product.get('stock_quantity') or 0
+            if update_data['stock_quantity'] != old_stock:
+                record_stock_movement(
+                    previous_product['_id'],
+                    update_data['stock_quantity'] - old_stock,
+                    update_data['stock_quantity'],
+                    'manual_adjustment'
+                )
+            
             updated_product = products_collection.find_one({'_id': ObjectId(product_id)})
             if updated_product:
                 if updated_product.get('category_id'):
                     category = categories_collection.find_one({'_id': ObjectId(updated_product['category_id'])})
                     updated_product['category_name'] = category['name'] if category else 'Unknown'
                 
-                serialized_product = serialize_doc(updated_product)
-                return jsonify(serialized_product)
+                return jsonify(updated_product)
             
             return jsonify({'message': 'Product updated successfully'})
         return jsonify({'error': 'Product not found'}), 404
@@ -280,10 +346,12 @@ def archive_product(product_id):
                 'updated_at': datetime.utcnow()
             }}
         )
+        bump('products')
         
         if result.modified_count:
             # Renumber remaining products
-            renumber_products()
+            if not lazy_product_ids():
+                renumber_products()
             return jsonify({'message': 'Product archived successfully'})
         return jsonify({'error': 'Failed to archive product'}), 500
         
@@ -343,10 +411,12 @@ def restore_product(product_id):
                 'updated_at': datetime.utcnow()
             }}
         )
+        bump('products')
         
         if result.modified_count:
             # Renumber products after restoration
-            renumber_products()
+            if not lazy_product_ids():
+                renumber_products()
             return jsonify({'message': 'Product restored successfully'})
         return jsonify({'error': 'Failed to restore product'}), 500
         
@@ -354,6 +424,7 @@ def restore_product(product_id):
         return jsonify({'error': str(e)}), 500
 
 @products_bp.route('/products/category/<category_id>', methods=['GET'])
+@conditional_get('products', 'categories')
 def get_products_by_category_id(category_id):
     try:
         # Only get non-archived products
@@ -362,13 +433,15 @@ def get_products_by_category_id(category_id):
             'is_archived': {'$ne': True}
         }).sort("product_name", 1))
         
+        if lazy_product_ids():
+            attach_display_ids(products)
+        
         for product in products:
             if product.get('category_id'):
                 category = categories_collection.find_one({'_id': ObjectId(product['category_id'])})
                 product['category_name'] = category['name'] if category else 'Unknown'
         
-        serialized_products = [serialize_doc(product) for product in products]
-        return jsonify(serialized_products)
+        return jsonify(products)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -384,12 +457,10 @@ def renumber_all_products():
 
 # GET ARCHIVED PRODUCTS WITH SEARCH
 @products_bp.route('/products/archived', methods=['GET'])
+@conditional_get('products', 'categories')
 def get_archived_products():
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
         search = request.args.get('search', '').strip()
-        skip = (page - 1) * per_page
         
         # Build query for archived products with search
         query = {'is_archived': True}
@@ -403,15 +474,7 @@ def get_archived_products():
                 {'category': regex_pattern}
             ]
         
-        total_products = products_collection.count_documents(query)
-        total_pages = (total_products + per_page - 1) // per_page
-        
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        products_cursor = products_collection.find(query).sort("archived_at", -1).skip(skip).limit(per_page)
-        products = list(products_cursor)
+        products, pagination = paginate(products_collection, query, 'total_products', 'archived_at', DESCENDING)
         
         for product in products:
             if product.get('category_id'):
@@ -420,16 +483,75 @@ def get_archived_products():
             elif product.get('category'):
                 product['category_name'] = product['category']
         
-        serialized_products = [serialize_doc(product) for product in products]
+        return jsonify({
+            'products': products,
+            'pagination': pagination
+        })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def parse_timestamp(value):
+    """ISO 8601 date or date-time from a query string, as naive UTC like PyMongo's"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+# GET STOCK AT A POINT IN TIME FROM THE STOCK LEDGER
+@products_bp.route('/products/<product_id>/stock', methods=['GET'])
+def get_product_stock_at(product_id):
+    try:
+        at_param = request.args.get('at')
+        try:
+            at = parse_timestamp(at_param) if at_param else datetime.utcnow()
+        except ValueError:
+            return jsonify({'error': 'Invalid timestamp. Use ISO 8601, e.g. 2025-11-07T08:00:00Z'}), 400
+        
+        product = products_collection.find_one({'_id': ObjectId(product_id)}, {'product_name': 1, 'stock_quantity': 1})
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
+        
+        stock, movement = stock_at(product_id, at)
+        if stock is None:
+            # No recorded movements: the stock has not changed since the ledger started
+            stock = product.get('stock_quantity', 0)
+        
+        return jsonify({
+            'product_id': product['_id'],
+            'product_name': product.get('product_name'),
+            'at': at,
+            'stock_quantity': stock,
+            'last_movement': movement
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# GET STOCK MOVEMENTS FOR A PRODUCT
+@products_bp.route('/products/<product_id>/stock-movements', methods=['GET'])
+def get_product_stock_movements(product_id):
+    try:
+        query = {'product_id': ObjectId(product_id)}
+        
+        try:
+            date_range = {}
+            if request.args.get('start'):
+                date_range['$gte'] = parse_timestamp(request.args['start'])
+            if request.args.get('end'):
+                date_range['$lte'] = parse_timestamp(request.args['end'])
+        except ValueError:
+            return jsonify({'error': 'Invalid timestamp. Use ISO 8601, e.g. 2025-11-07T08:00:00Z'}), 400
+        if date_range:
+            query['at'] = date_range
+        
+        movements, pagination = paginate(stock_movements_collection, query, 'total_movements', 'at', DESCENDING)
         
         return jsonify({
-            'products': serialized_products,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_products': total_products,
-                'total_pages': total_pages
-            }
+            'movements': movements,
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
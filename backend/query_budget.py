@@ -0,0 +1,157 @@
+# query_budget.py
+# MongoDB query budgets and N+1 detection for development and tests.
+#
+# QUERY_BUDGET_MODE=warn prints a warning for every request that runs more
+# MongoDB commands than its route's budget, or repeats one query shape at least
+# N_PLUS_ONE_THRESHOLD times (a lookup per row). QUERY_BUDGET_MODE=raise raises
+# QueryBudgetExceeded instead, which fails the request in tests. The default,
+# off, records nothing.
+#
+# Routes get QUERY_BUDGET_DEFAULT commands unless decorated with @query_budget(n).
+# In tests, assert_max_queries('/users?page=1', 6) checks one request directly.
+from flask import request
+from pymongo import monitoring
+from collections import Counter
+import os
+import threading
+
+# What each command filters on, for telling query shapes apart
+SHAPE_FIELDS = {
+    'find': 'filter',
+    'aggregate': 'pipeline',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'update': 'updates',
+    'delete': 'deletes',
+}
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+mode = 'off'
+default_budget = 25
+n_plus_one_threshold = 5
+
+# Commands of the request being handled on this thread, like metrics.request_state
+tracking = threading.local()
+
+def query_shape(value):
+    """The query with every value replaced by ?, so per-row lookups compare equal"""
+    if isinstance(value, dict):
+        return '{' + ', '.join(f'{key}: {query_shape(item)}' for key, item in value.items()) + '}'
+    if isinstance(value, (list, tuple)):
+        # $in lists and batches differ in length, not in shape
+        return '[' + ', '.join(sorted({query_shape(item) for item in value})) + ']'
+    return '?'
+
+def command_shape(command_name, command):
+    collection = command.get(command_name)
+    field = SHAPE_FIELDS.get(command_name)
+    shape = query_shape(command.get(field)) if field else ''
+    return f"{command_name} {collection if isinstance(collection, str) else ''} {shape}".strip()
+
+class QueryTracker(monitoring.CommandListener):
+    """Records the shape of every command sent while a request is tracked"""
+
+    def started(self, event):
+        shapes = getattr(tracking, 'shapes', None)
+        if shapes is None:
+            return
+        tracking.commands += 1
+        # getMore continues a cursor rather than issuing a new query
+        if event.command_name != 'getMore':
+            shapes[command_shape(event.command_name, event.command)] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+query_tracker = QueryTracker()
+
+def query_budget(limit):
+    """Allow a route `limit` MongoDB commands per request instead of QUERY_BUDGET_DEFAULT"""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+def route_budget(app):
+    view = app.view_functions.get(request.endpoint)
+    return getattr(view, 'query_budget', default_budget)
+
+class QueryReport:
+    def __init__(self, route, commands, shapes, budget):
+        self.route = route
+        self.commands = commands
+        self.budget = budget
+        self.shapes = shapes.most_common()
+        self.repeated = [(shape, count) for shape, count in self.shapes if count >= n_plus_one_threshold]
+
+    def problems(self):
+        problems = []
+        if self.commands > self.budget:
+            problems.append(f"{self.commands} MongoDB commands, budget {self.budget}")
+        for shape, count in self.repeated:
+            problems.append(f"{count}x {shape} (possible N+1)")
+        return problems
+
+def start_tracking():
+    tracking.commands = 0
+    tracking.shapes = Counter()
+
+def stop_tracking(budget):
+    route = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+    report = QueryReport(route, tracking.commands, tracking.shapes, budget)
+    tracking.shapes = None
+    tracking.last_report = report
+    return report
+
+def init_query_budget(app):
+    """Install the request hooks from app.py; pass query_tracker to MongoClient(event_listeners=...)"""
+    global mode, default_budget, n_plus_one_threshold
+    mode = os.getenv("QUERY_BUDGET_MODE", "off").lower()
+    default_budget = int(os.getenv("QUERY_BUDGET_DEFAULT", "25"))
+    n_plus_one_threshold = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+    @app.before_request
+    def begin_query_budget():
+        if mode != 'off' or getattr(tracking, 'forced', False):
+            start_tracking()
+
+    @app.after_request
+    def check_query_budget(response):
+        if getattr(tracking, 'shapes', None) is None:
+            return response
+        report = stop_tracking(route_budget(app))
+        problems = report.problems()
+        if problems and mode == 'raise':
+            raise QueryBudgetExceeded(f"{report.route}: " + '; '.join(problems))
+        if problems and mode == 'warn':
+            print(f"⚠️ {report.route}: " + '; '.join(problems))
+        return response
+
+def assert_max_queries(route, n, client=None, method='GET', **kwargs):
+    """Pytest helper: request `route` and fail if it ran more than n MongoDB commands.
+
+    Uses the app's test client unless one is given; extra keyword arguments go
+    to the request, e.g. json=... for a POST. Returns the response.
+    """
+    if client is None:
+        from app import app
+        client = app.test_client()
+
+    tracking.forced = True
+    tracking.last_report = None
+    try:
+        response = client.open(route, method=method, **kwargs)
+    finally:
+        tracking.forced = False
+
+    report = tracking.last_report
+    assert report is not None, f"{method} {route} was not tracked; is init_query_budget(app) installed?"
+    details = ''.join(f"\n    {count}x {shape}" for shape, count in report.shapes)
+    assert report.commands <= n, f"{method} {route} ran {report.commands} MongoDB commands, expected at most {n}:{details}"
+    return response
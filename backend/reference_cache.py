@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+
+class ReferenceSnapshot:
+    """Process-local copy of a small reference collection, indexed by _id and by name"""
+
+    def __init__(self, name_field):
+        self.name_field = name_field
+        self.ttl = 0
+        self.collection = None
+        self._lock = threading.Lock()
+        self._by_id = None
+        self._by_name = None
+        self._loaded_at = 0
+
+    def bind(self, collection, ttl):
+        self.collection = collection
+        self.ttl = ttl
+        self.invalidate()
+
+    def invalidate(self):
+        with self._lock:
+            self._by_id = None
+            self._by_name = None
+
+    def _load(self):
+        with self._lock:
+            if self._by_id is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._by_id, self._by_name
+
+            by_id = {}
+            by_name = {}
+            for doc in self.collection.find():
+                by_id[doc['_id']] = doc
+                # Keep the first match per name, same as find_one would return
+                by_name.setdefault(doc.get(self.name_field), doc)
+
+            self._by_id, self._by_name = by_id, by_name
+            self._loaded_at = time.monotonic()
+            return by_id, by_name
+
+    def get(self, doc_id):
+        by_id, _ = self._load()
+        doc = by_id.get(doc_id)
+        return dict(doc) if doc else None
+
+    def get_by_name(self, name):
+        _, by_name = self._load()
+        doc = by_name.get(name)
+        return dict(doc) if doc else None
+
+    def all(self):
+        by_id, _ = self._load()
+        return [dict(doc) for doc in by_id.values()]
+
+categories_cache = ReferenceSnapshot('name')
+service_types_cache = ReferenceSnapshot('service_name')
+groups_cache = ReferenceSnapshot('group_name')
+
+def init_reference_cache(categories_coll, service_types_coll, groups_coll):
+    """Initialize the collections from app.py"""
+    # Seconds a snapshot is served before it is re-read from MongoDB. Writes in
+    # this process invalidate immediately; other workers catch up within the TTL.
+    ttl = float(os.getenv("REFERENCE_CACHE_TTL", "300"))
+
+    categories_cache.bind(categories_coll, ttl)
+    service_types_cache.bind(service_types_coll, ttl)
+    groups_cache.bind(groups_coll, ttl)
+
+def get_service_category_name(service_name):
+    """Category name for a service, or None when the service or category is unknown"""
+    service = service_types_cache.get_by_name(service_name)
+    if service and service.get('category_id'):
+        category = categories_cache.get(service['category_id'])
+        return category['name'] if category else None
+    return None
+
+def invalidate_categories():
+    categories_cache.invalidate()
+
+def invalidate_service_types():
+    service_types_cache.invalidate()
+
+def invalidate_groups():
+    groups_cache.invalidate()
@@ -4,24 +4,22 @@ from bson import ObjectId
 from datetime import datetime, timedelta
 import os
 
+from exports import stream_export, get_export_format, date_range_filter, InvalidExport
+
 # Create Blueprint for sales reports
 sales_report_bp = Blueprint('sales_report', __name__)
 
 # MongoDB collections (will be initialized from app.py)
 transactions_collection = None
 service_types_collection = None
+daily_sales_collection = None
 
-def init_sales_report_db(transactions_coll, service_types_coll):
+def init_sales_report_db(transactions_coll, service_types_coll, daily_sales_coll):
     """Initialize the collections from app.py"""
-    global transactions_collection, service_types_collection
+    global transactions_collection, service_types_collection, daily_sales_collection
     transactions_collection = transactions_coll
     service_types_collection = service_types_coll
-
-# Helper to convert ObjectId to string
-def serialize_doc(doc):
-    if doc and '_id' in doc:
-        doc['_id'] = str(doc['_id'])
-    return doc
+    daily_sales_collection = daily_sales_coll
 
 # Sales Report Endpoint
 @sales_report_bp.route('/reports/sales', methods=['GET'])
@@ -47,32 +45,33 @@ def get_sales_report():
         print(f"=== SALES REPORT DEBUG ===")
         print(f"Date Range: {start_date_str} to {end_date_str}")
         
-        # Query transactions within date range and completed status
+        # Read the daily_sales rollup - at most one row per day per service.
+        # Like /sales/analytics it counts 'completed' in any letter case.
         query = {
-            'status': 'Completed',
             'date': {
                 '$gte': start_date_str,
                 '$lte': end_date_str
             }
         }
         
-        transactions = list(transactions_collection.find(query))
-        print(f"Found {len(transactions)} completed transactions in date range")
+        rollup_rows = list(daily_sales_collection.find(query))
+        print(f"Found {len(rollup_rows)} daily sales rows in date range")
         
         # Calculate total revenue and transaction count
         total_revenue = 0
-        transaction_count = len(transactions)
+        transaction_count = 0
         
         # Calculate service type breakdown
         service_type_breakdown = {}
         
-        for transaction in transactions:
-            # Add to total revenue
-            total_amount = float(transaction.get('total_amount', 0))
-            total_revenue += total_amount
+        for row in rollup_rows:
+            revenue = float(row.get('revenue', 0))
+            count = int(row.get('count', 0))
+            total_revenue += revenue
+            transaction_count += count
             
             # Track by service type
-            service_type = transaction.get('service_type', 'Unknown')
+            service_type = row.get('service_type') or 'Unknown'
             if service_type not in service_type_breakdown:
                 service_type_breakdown[service_type] = {
                     'service_name': service_type,
@@ -80,8 +79,8 @@ def get_sales_report():
                     'revenue': 0
                 }
             
-            service_type_breakdown[service_type]['transaction_count'] += 1
-            service_type_breakdown[service_type]['revenue'] += total_amount
+            service_type_breakdown[service_type]['transaction_count'] += count
+            service_type_breakdown[service_type]['revenue'] += revenue
         
         # Convert to list and sort by revenue descending
         service_breakdown_list = list(service_type_breakdown.values())
@@ -96,10 +95,10 @@ def get_sales_report():
             current_date += timedelta(days=1)
         
         # Fill in actual daily sales
-        for transaction in transactions:
-            date_str = transaction.get('date')
+        for row in rollup_rows:
+            date_str = row.get('date')
             if date_str in daily_sales:
-                daily_sales[date_str] += float(transaction.get('total_amount', 0))
+                daily_sales[date_str] += float(row.get('revenue', 0))
         
         # Convert daily sales to list format for frontend
         daily_sales_list = [
@@ -132,4 +131,31 @@ def get_sales_report():
         
     except Exception as e:
         print(f"Error generating sales report: {str(e)}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+# Columns of /reports/sales/export, in order
+SALES_EXPORT_FIELDS = [
+    'date', 'transaction_id', 'customer_name', 'service_type', 'product_name',
+    'quantity', 'price_per_unit', 'total_amount', 'status', 'created_at'
+]
+
+# Completed transactions behind the sales report, as CSV or NDJSON
+@sales_report_bp.route('/reports/sales/export', methods=['GET'])
+def export_sales_report():
+    try:
+        export_format = get_export_format()
+        query = date_range_filter(required=True)
+        
+        # Same sales as the daily_sales rollup: completed in any letter case, archived or not
+        query['status'] = {'$regex': '^completed$', '$options': 'i'}
+        
+        cursor = transactions_collection.find(
+            query, {field: 1 for field in SALES_EXPORT_FIELDS}
+        ).sort([('date', 1), ('_id', 1)])
+        
+        return stream_export(cursor, SALES_EXPORT_FIELDS, export_format, 'sales-report')
+    except InvalidExport as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error exporting sales report: {str(e)}")
+        return jsonify({'error': str(e)}), 500
@@ -10,18 +10,14 @@ sales_bp = Blueprint('sales', __name__)
 # MongoDB connection (will be initialized from app.py)
 transactions_collection = None
 service_types_collection = None
+daily_sales_collection = None
 
-def init_sales_db(transactions_coll, service_types_coll):
+def init_sales_db(transactions_coll, service_types_coll, daily_sales_coll):
     """Initialize the collections from app.py"""
-    global transactions_collection, service_types_collection
+    global transactions_collection, service_types_collection, daily_sales_collection
     transactions_collection = transactions_coll
     service_types_collection = service_types_coll
-
-# Helper to convert ObjectId to string
-def serialize_doc(doc):
-    if doc:
-        doc['_id'] = str(doc['_id'])
-    return doc
+    daily_sales_collection = daily_sales_coll
 
 # Get sales analytics data
 @sales_bp.route('/sales/analytics', methods=['GET'])
@@ -43,127 +39,66 @@ def get_sales_analytics():
         print(f"PH Date - Today: {today_str} ({today.strftime('%A')})")
         print(f"Weekly Start: {weekly_start_str} ({weekly_start.strftime('%A')})")
 
-        # FIXED: Use exact case matching like in local version
-        completed_transactions = list(transactions_collection.find({
-            'status': {'$regex': '^completed$', '$options': 'i'}  # 'i' = case insensitive
-        }))
-        
-        print(f"Total completed transactions: {len(completed_transactions)}")
-        
-        # Filter transactions for different time periods
-        today_transactions = []
-        weekly_transactions = []
-        
-        for transaction in completed_transactions:
-            transaction_date = transaction.get('date')
-            if not transaction_date:
-                continue
-                
-            # Convert transaction date to datetime object for comparison
-            try:
-                trans_date = datetime.strptime(transaction_date, '%Y-%m-%d').date()
-            except:
-                continue
-            
-            if transaction_date == today_str:
-                today_transactions.append(transaction)
-            
-            if weekly_start <= trans_date <= today:
-                weekly_transactions.append(transaction)
-        
-        print(f"Today transactions: {len(today_transactions)}")
-        print(f"Weekly transactions: {len(weekly_transactions)}")
-        
-        # Calculate summary metrics
-        today_sales = sum(float(t.get('total_amount', 0)) for t in today_transactions)
-        weekly_sales = sum(float(t.get('total_amount', 0)) for t in weekly_transactions)
-        
-        # Calculate daily totals for the last 7 days for chart
-        daily_totals = {}
-        day_names = {}
-        for i in range(7):
-            date = (today - timedelta(days=i))
-            date_str = date.strftime('%Y-%m-%d')
-            day_name = date.strftime('%a')  # Short day name (Mon, Tue, etc.)
-            daily_totals[date_str] = 0
-            day_names[date_str] = day_name
-            print(f"Day {i}: {date_str} ({day_name})")
-        
-        # Fill in actual sales data
-        for transaction in weekly_transactions:
-            date = transaction.get('date')
-            if date in daily_totals:
-                daily_totals[date] += float(transaction.get('total_amount', 0))
-        
-        # Calculate how many days have passed in the current week (Mon=0 to Sun=6)
-        # For daily average, we only count days that have actually occurred
-        current_weekday = today.weekday()  # Monday=0, Sunday=6
-        days_passed_in_week = current_weekday + 1  # +1 because we include today
-        
-        # But for the chart, we want exactly 7 days
-        daily_average = weekly_sales / 7  # Always divide by 7 for weekly average
-        
-        print(f"Today sales: {today_sales}")
-        print(f"Weekly sales: {weekly_sales}")
-        print(f"Current weekday: {current_weekday} ({today.strftime('%A')})")
-        print(f"Days passed in week: {days_passed_in_week}")
-        print(f"Daily average: {daily_average}")
-        
-        # Find top service by number of transactions
-        service_counts = {}
-        for transaction in completed_transactions:
-            service_type = transaction.get('service_type')
-            if service_type:
-                service_counts[service_type] = service_counts.get(service_type, 0) + 1
-        
-        top_service = max(service_counts.items(), key=lambda x: x[1])[0] if service_counts else "No data"
-        print(f"Top service: {top_service}")
-        
-        # Get daily sales for the last 7 days for chart - in correct chronological order
+        # Let MongoDB do the totals over the daily_sales rollup so only the
+        # small result set crosses the wire
+        pipeline = [
+            {'$facet': {
+                'today': [
+                    {'$match': {'date': today_str}},
+                    {'$group': {'_id': None, 'total': {'$sum': '$revenue'}}}
+                ],
+                'daily': [
+                    {'$match': {'date': {'$gte': weekly_start_str, '$lte': today_str}}},
+                    {'$group': {'_id': '$date', 'total': {'$sum': '$revenue'}}}
+                ],
+                'services': [
+                    {'$match': {'service_type': {'$nin': [None, '']}}},
+                    {'$group': {
+                        '_id': '$service_type',
+                        'transactions': {'$sum': '$count'},
+                        'total_sales': {'$sum': '$revenue'}
+                    }},
+                    {'$sort': {'total_sales': -1, '_id': 1}}
+                ]
+            }}
+        ]
+        result = next(daily_sales_collection.aggregate(pipeline))
+
+        today_sales = result['today'][0]['total'] if result['today'] else 0
+        daily_totals = {row['_id']: row['total'] for row in result['daily']}
+        weekly_sales = sum(daily_totals.values())
+
+        # Always divide by 7 for weekly average
+        daily_average = weekly_sales / 7
+
+        # Top service by number of transactions
+        service_rows = result['services']
+        top_service = max(service_rows, key=lambda x: x['transactions'])['_id'] if service_rows else "No data"
+
+        # Daily sales for the last 7 days for chart, oldest to newest
         daily_sales_data = []
         labels = []
-        
-        # Start from oldest to newest (Monday to Sunday)
         for i in range(6, -1, -1):
             date = (today - timedelta(days=i))
             date_str = date.strftime('%Y-%m-%d')
-            day_name = day_names.get(date_str, date.strftime('%a'))
-            labels.append(day_name)
+            labels.append(date.strftime('%a'))
             daily_sales_data.append(daily_totals.get(date_str, 0))
-            print(f"Chart position {i}: {day_name} ({date_str}) = {daily_totals.get(date_str, 0)}")
-        
+
+        # Service revenue summary, already sorted by revenue descending
+        service_summary = [
+            {
+                'service': row['_id'],
+                'transactions': row['transactions'],
+                'total_sales': row['total_sales']
+            }
+            for row in service_rows
+        ]
+
+        print(f"Today sales: {today_sales}")
+        print(f"Weekly sales: {weekly_sales}")
+        print(f"Top service: {top_service}")
         print(f"Final chart labels: {labels}")
         print(f"Final chart data: {daily_sales_data}")
-        
-        # Get service revenue summary
-        service_revenue = {}
-        service_transaction_counts = {}
-        
-        for transaction in completed_transactions:
-            service_type = transaction.get('service_type')
-            total_amount = float(transaction.get('total_amount', 0))
-            
-            if service_type:
-                if service_type not in service_revenue:
-                    service_revenue[service_type] = 0
-                    service_transaction_counts[service_type] = 0
-                
-                service_revenue[service_type] += total_amount
-                service_transaction_counts[service_type] += 1
-        
-        # Convert to list for frontend
-        service_summary = []
-        for service_type, revenue in service_revenue.items():
-            service_summary.append({
-                'service': service_type,
-                'transactions': service_transaction_counts[service_type],
-                'total_sales': revenue
-            })
-        
-        # Sort by revenue descending
-        service_summary.sort(key=lambda x: x['total_sales'], reverse=True)
-        
-        print(f"Service summary: {service_summary}")
         print(f"=== END DEBUG ===")
         
         return jsonify({
@@ -236,7 +171,7 @@ def debug_transactions():
             'status_counts': status_counts,
             'total_transactions': len(all_transactions),
             'completed_transactions_count': len(completed_transactions),
-            'completed_transactions_sample': [serialize_doc(t) for t in completed_transactions[:5]]  # First 5 for sample
+            'completed_transactions_sample': completed_transactions[:5]  # First 5 for sample
         })
         
     except Exception as e:
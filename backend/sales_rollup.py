@@ -0,0 +1,132 @@
+# sales_rollup.py
+from pymongo import MongoClient
+from datetime import datetime
+import os
+from dotenv import load_dotenv
+
+import counters
+
+# MongoDB collections (will be initialized from app.py)
+daily_sales_collection = None
+transactions_collection = None
+
+def init_sales_rollup_db(daily_sales_coll, transactions_coll):
+    """Initialize the collections from app.py"""
+    global daily_sales_collection, transactions_collection
+    daily_sales_collection = daily_sales_coll
+    transactions_collection = transactions_coll
+
+# counters document recording that the rollup has been built from history
+REBUILT_MARKER = 'daily_sales_rebuilt'
+
+def ensure_daily_sales():
+    """Build the rollup from history once per database, on the first startup.
+
+    The marker, not an empty rollup, says it is done: with no completed sale
+    yet the rollup stays empty and would otherwise be rebuilt on every boot.
+    """
+    if counters.counters_collection.find_one({'_id': REBUILT_MARKER}):
+        return
+    # Rollups built before the marker existed are already current
+    if daily_sales_collection.estimated_document_count() == 0:
+        rebuild_daily_sales()
+    else:
+        mark_rebuilt()
+
+def mark_rebuilt():
+    counters.counters_collection.update_one(
+        {'_id': REBUILT_MARKER},
+        {'$set': {'at': datetime.utcnow()}},
+        upsert=True
+    )
+
+def is_completed_sale(transaction):
+    """Completed transactions count as sales, archived or not, in any letter case.
+
+    /sales/analytics always matched 'completed' case-insensitively; /reports/sales
+    matched 'Completed' exactly until both were served from this rollup, and now
+    counts 'completed' rows too.
+    """
+    return bool(transaction) and str(transaction.get('status', '')).lower() == 'completed'
+
+def _apply_sale(transaction, sign):
+    amount = float(transaction.get('total_amount') or 0)
+    key = {'date': transaction.get('date'), 'service_type': transaction.get('service_type')}
+    daily_sales_collection.update_one(
+        key,
+        {
+            '$inc': {'revenue': sign * amount, 'count': sign},
+            '$set': {'updated_at': datetime.utcnow()}
+        },
+        upsert=True
+    )
+
+    # Drop rows whose last sale went away so reports never list empty services
+    if sign < 0:
+        daily_sales_collection.delete_one({**key, 'count': {'$lte': 0}})
+
+def record_sale_change(old_transaction, new_transaction):
+    """Move a transaction's contribution in daily_sales from its old state to its new one.
+
+    Pass None for old_transaction on insert and for new_transaction on delete.
+    """
+    try:
+        old_counted = is_completed_sale(old_transaction)
+        new_counted = is_completed_sale(new_transaction)
+
+        if old_counted and new_counted:
+            unchanged = all(
+                old_transaction.get(field) == new_transaction.get(field)
+                for field in ('date', 'service_type', 'total_amount')
+            )
+            if unchanged:
+                return
+
+        if old_counted:
+            _apply_sale(old_transaction, -1)
+        if new_counted:
+            _apply_sale(new_transaction, 1)
+    except Exception as e:
+        # The transaction write already succeeded; a rebuild will fix the rollup
+        print(f"Error updating daily sales rollup: {e}")
+
+def rebuild_daily_sales():
+    """Regenerate the whole daily_sales rollup from transaction history"""
+    pipeline = [
+        {'$match': {'status': {'$regex': '^completed$', '$options': 'i'}}},
+        {'$group': {
+            '_id': {'date': '$date', 'service_type': '$service_type'},
+            'revenue': {'$sum': {'$toDouble': {'$ifNull': ['$total_amount', 0]}}},
+            'count': {'$sum': 1}
+        }},
+        {'$project': {
+            '_id': 0,
+            'date': '$_id.date',
+            'service_type': '$_id.service_type',
+            'revenue': 1,
+            'count': 1,
+            'updated_at': {'$literal': datetime.utcnow()}
+        }},
+        {'$out': daily_sales_collection.name}
+    ]
+    transactions_collection.aggregate(pipeline)
+    mark_rebuilt()
+    rows = daily_sales_collection.count_documents({})
+    print(f"✅ Rebuilt daily sales rollup: {rows} row(s)")
+    return rows
+
+if __name__ == "__main__":
+    load_dotenv()
+    MONGO_URI = os.getenv("MONGO_URI")
+    if not MONGO_URI:
+        raise ValueError("MONGO_URI not set in .env")
+
+    client = MongoClient(MONGO_URI)
+    try:
+        db = client["CopyCornerSystem"]
+        print("🔄 Rebuilding daily sales rollup...")
+        init_sales_rollup_db(db["daily_sales"], db["transactions"])
+        counters.init_counters_db(db["counters"])
+        rebuild_daily_sales()
+    finally:
+        client.close()
@@ -20,20 +20,6 @@ def init_schedules_db(mongo_schedules_collection, mongo_users_collection, mongo_
     users_collection = mongo_users_collection
     groups_collection = mongo_groups_collection
 
-# Helper to convert ObjectId to string
-def serialize_doc(doc):
-    if doc:
-        doc['_id'] = str(doc['_id'])
-        # Convert staff_id to string if it exists
-        if 'staff_id' in doc and doc['staff_id']:
-            doc['staff_id'] = str(doc['staff_id'])
-        # Handle date fields
-        for field in ['created_at', 'updated_at', 'start_time', 'end_time']:
-            if field in doc and doc[field]:
-                if isinstance(doc[field], datetime):
-                    doc[field] = doc[field].isoformat()
-    return doc
-
 # Get all schedules with staff names
 @schedules_bp.route('/schedules', methods=['GET'])
 def get_schedules():
@@ -51,8 +37,7 @@ def get_schedules():
             
             schedules.append(schedule)
         
-        serialized_schedules = [serialize_doc(schedule) for schedule in schedules]
-        return jsonify(serialized_schedules)
+        return jsonify(schedules)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -66,7 +51,7 @@ def get_schedule(schedule_id):
             if schedule.get('staff_id'):
                 staff = users_collection.find_one({'_id': ObjectId(schedule['staff_id'])})
                 schedule['staff_name'] = staff['name'] if staff else 'Unknown'
-            return jsonify(serialize_doc(schedule))
+            return jsonify(schedule)
         return jsonify({'error': 'Schedule not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -106,7 +91,7 @@ def create_schedule():
         new_schedule['_id'] = str(result.inserted_id)
         new_schedule['staff_id'] = str(new_schedule['staff_id']) if new_schedule['staff_id'] else None
         
-        return jsonify(serialize_doc(new_schedule)), 201
+        return jsonify(new_schedule), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
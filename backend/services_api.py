@@ -1,9 +1,13 @@
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient
+from pymongo import MongoClient, DESCENDING
 from bson import ObjectId
 from datetime import datetime
 import json
 
+from reference_cache import invalidate_service_types, categories_cache
+from change_stamps import bump, conditional_get
+from pagination import paginate, InvalidCursor
+
 service_types_bp = Blueprint('service_types', __name__)
 
 service_types_collection = None
@@ -27,24 +31,6 @@ class JSONEncoder(json.JSONEncoder):
             return str(obj)
         return super().default(obj)
 
-def serialize_doc(doc):
-    if not doc:
-        return doc
-    
-    serialized = {}
-    for key, value in doc.items():
-        if isinstance(value, ObjectId):
-            serialized[key] = str(value)
-        elif isinstance(value, datetime):
-            serialized[key] = value.isoformat()
-        elif isinstance(value, dict):
-            serialized[key] = serialize_doc(value)
-        elif isinstance(value, list):
-            serialized[key] = [serialize_doc(item) if isinstance(item, dict) else item for item in value]
-        else:
-            serialized[key] = value
-    return serialized
-
 def generate_service_id():
     services = list(service_types_collection.find({"is_archived": {"$ne": True}}).sort("created_at", 1))
     if not services:
@@ -53,11 +39,27 @@ def generate_service_id():
     count = service_types_collection.count_documents({"is_archived": {"$ne": True}})
     return f"ST-{count + 1:03d}"
 
+def attach_category_names(service_types, uncategorized='Uncategorized'):
+    """Set category_name on a list of services from the cached categories, not one query per row"""
+    for service in service_types:
+        # Handle both old 'category' field and new 'category_id' relationship
+        if service.get('category_id'):
+            category = categories_cache.get(ObjectId(service['category_id']))
+            service['category_name'] = category['name'] if category else 'Unknown'
+        elif service.get('category'):
+            # Fallback to old category field
+            service['category_name'] = service['category']
+        elif uncategorized:
+            service['category_name'] = uncategorized
+    return service_types
+
 @service_types_bp.route('/service_types', methods=['GET'])
+@conditional_get('service_type', 'categories')
 def get_service_types():
     try:
         page_param = request.args.get('page')
         per_page_param = request.args.get('per_page')
+        after_param = request.args.get('after')
         search = request.args.get('search', '').strip()
         
         # Only fetch non-archived service types
@@ -89,69 +91,35 @@ def get_service_types():
             query['$or'] = search_conditions
         
         # If no pagination parameters, return all active service types
-        if not page_param and not per_page_param:
+        if not page_param and not per_page_param and after_param is None:
             service_types = list(service_types_collection.find(query).sort("service_name", 1))
             
-            for service in service_types:
-                # Handle both old 'category' field and new 'category_id' relationship
-                if service.get('category_id'):
-                    category = categories_collection.find_one({'_id': ObjectId(service['category_id'])})
-                    service['category_name'] = category['name'] if category else 'Unknown'
-                elif service.get('category'):
-                    # Fallback to old category field
-                    service['category_name'] = service['category']
-                else:
-                    service['category_name'] = 'Uncategorized'
+            attach_category_names(service_types)
             
-            serialized_service_types = [serialize_doc(service_type) for service_type in service_types]
-            return jsonify(serialized_service_types)
+            return jsonify(service_types)
         
         # Handle paginated request
-        page = int(page_param or 1)
-        per_page = int(per_page_param or 10)
-        skip = (page - 1) * per_page
-        
-        total_service_types = service_types_collection.count_documents(query)
-        total_pages = (total_service_types + per_page - 1) // per_page
+        service_types, pagination = paginate(service_types_collection, query, 'total_service_types', 'created_at', DESCENDING)
         
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        service_types_cursor = service_types_collection.find(query).sort("created_at", -1).skip(skip).limit(per_page)
-        service_types = list(service_types_cursor)
-        
-        for service in service_types:
-            # Handle both old 'category' field and new 'category_id' relationship
-            if service.get('category_id'):
-                category = categories_collection.find_one({'_id': ObjectId(service['category_id'])})
-                service['category_name'] = category['name'] if category else 'Unknown'
-            elif service.get('category'):
-                # Fallback to old category field
-                service['category_name'] = service['category']
-            else:
-                service['category_name'] = 'Uncategorized'
-        
-        serialized_service_types = [serialize_doc(service_type) for service_type in service_types]
+        attach_category_names(service_types)
         
         return jsonify({
-            'service_types': serialized_service_types,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_service_types': total_service_types,
-                'total_pages': total_pages
-            }
+            'service_types': service_types,
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # GET ARCHIVED SERVICE TYPES - UPDATED WITH CATEGORY SEARCH
 @service_types_bp.route('/service_types/archived', methods=['GET'])
+@conditional_get('service_type', 'categories')
 def get_archived_service_types():
     try:
         page_param = request.args.get('page')
         per_page_param = request.args.get('per_page')
+        after_param = request.args.get('after')
         search = request.args.get('search', '').strip()
         
         query = {"is_archived": True}
@@ -182,52 +150,24 @@ def get_archived_service_types():
             query['$or'] = search_conditions
         
         # Handle paginated request
-        if page_param or per_page_param:
-            page = int(page_param or 1)
-            per_page = int(per_page_param or 10)
-            skip = (page - 1) * per_page
-            
-            total_service_types = service_types_collection.count_documents(query)
-            total_pages = (total_service_types + per_page - 1) // per_page
-            
-            if page > total_pages and total_pages > 0:
-                page = total_pages
-                skip = (page - 1) * per_page
-            
-            service_types_cursor = service_types_collection.find(query).sort("archived_at", -1).skip(skip).limit(per_page)
-            service_types = list(service_types_cursor)
-            
-            for service in service_types:
-                if service.get('category_id'):
-                    category = categories_collection.find_one({'_id': ObjectId(service['category_id'])})
-                    service['category_name'] = category['name'] if category else 'Unknown'
-                elif service.get('category'):
-                    service['category_name'] = service['category']
+        if page_param or per_page_param or after_param is not None:
+            service_types, pagination = paginate(service_types_collection, query, 'total_service_types', 'archived_at', DESCENDING)
             
-            serialized_service_types = [serialize_doc(service) for service in service_types]
+            attach_category_names(service_types, uncategorized=None)
             
             return jsonify({
-                'service_types': serialized_service_types,
-                'pagination': {
-                    'page': page,
-                    'per_page': per_page,
-                    'total_service_types': total_service_types,
-                    'total_pages': total_pages
-                }
+                'service_types': service_types,
+                'pagination': pagination
             })
         else:
             # Return all archived service types (for backward compatibility)
             service_types = list(service_types_collection.find(query).sort("archived_at", -1))
             
-            for service in service_types:
-                if service.get('category_id'):
-                    category = categories_collection.find_one({'_id': ObjectId(service['category_id'])})
-                    service['category_name'] = category['name'] if category else 'Unknown'
-                elif service.get('category'):
-                    service['category_name'] = service['category']
+            attach_category_names(service_types, uncategorized=None)
             
-            serialized_service_types = [serialize_doc(service) for service in service_types]
-            return jsonify(serialized_service_types)
+            return jsonify(service_types)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -239,7 +179,7 @@ def get_service_type(service_type_id):
             # Handle both old 'category' field and new 'category_id' relationship
             if service_type.get('category_id'):
                 category = categories_collection.find_one({'_id': ObjectId(service_type['category_id'])})
-                service_type['category_data'] = serialize_doc(category) if category else None
+                service_type['category_data'] = category
                 service_type['category_name'] = category['name'] if category else 'Unknown'
             elif service_type.get('category'):
                 # Fallback to old category field
@@ -252,7 +192,7 @@ def get_service_type(service_type_id):
             })
             service_type['transaction_count'] = transaction_count
             
-            return jsonify(serialize_doc(service_type))
+            return jsonify(service_type)
         return jsonify({'error': 'Service type not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -287,6 +227,8 @@ def create_service_type():
         }
         
         result = service_types_collection.insert_one(new_service_type)
+        invalidate_service_types()
+        bump('service_type')
         
         # Fetch the complete inserted document
         inserted_service = service_types_collection.find_one({'_id': result.inserted_id})
@@ -302,8 +244,7 @@ def create_service_type():
             inserted_service['category_name'] = inserted_service['category']
         
         # Properly serialize before returning
-        serialized_service = serialize_doc(inserted_service)
-        return jsonify(serialized_service), 201
+        return jsonify(inserted_service), 201
         
     except Exception as e:
         print(f"Error creating service type: {str(e)}")
@@ -354,6 +295,8 @@ def update_service_type(service_type_id):
             {'_id': ObjectId(service_type_id)},
             {'$set': update_data}
         )
+        invalidate_service_types()
+        bump('service_type')
         
         if result.matched_count:
             # Fetch the updated document
@@ -364,8 +307,7 @@ def update_service_type(service_type_id):
                     category = categories_collection.find_one({'_id': ObjectId(updated_service['category_id'])})
                     updated_service['category_name'] = category['name'] if category else 'Unknown'
                 
-                serialized_service = serialize_doc(updated_service)
-                return jsonify(serialized_service)
+                return jsonify(updated_service)
             
             return jsonify({'message': 'Service type updated successfully'})
         return jsonify({'error': 'Service type not found'}), 404
@@ -400,6 +342,8 @@ def archive_service_type(service_type_id):
                 'updated_at': datetime.utcnow()
             }}
         )
+        invalidate_service_types()
+        bump('service_type')
         
         if result.modified_count:
             return jsonify({'message': 'Service type archived successfully'})
@@ -459,6 +403,8 @@ def restore_service_type(service_type_id):
                 'updated_at': datetime.utcnow()
             }}
         )
+        invalidate_service_types()
+        bump('service_type')
         
         if result.modified_count:
             return jsonify({'message': 'Service type restored successfully'})
@@ -468,6 +414,7 @@ def restore_service_type(service_type_id):
         return jsonify({'error': str(e)}), 500
 
 @service_types_bp.route('/service_types/category/<category_id>', methods=['GET'])
+@conditional_get('service_type', 'categories')
 def get_service_types_by_category_id(category_id):
     try:
         service_types = list(service_types_collection.find({
@@ -476,17 +423,14 @@ def get_service_types_by_category_id(category_id):
             'is_archived': {'$ne': True}
         }).sort("service_name", 1))
         
-        for service in service_types:
-            if service.get('category_id'):
-                category = categories_collection.find_one({'_id': ObjectId(service['category_id'])})
-                service['category_name'] = category['name'] if category else 'Unknown'
+        attach_category_names(service_types)
         
-        serialized_service_types = [serialize_doc(service) for service in service_types]
-        return jsonify(serialized_service_types)
+        return jsonify(service_types)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @service_types_bp.route('/service_types/<service_type_id>/products', methods=['GET'])
+@conditional_get('service_type', 'products')
 def get_products_for_service_type(service_type_id):
     try:
         service_type = service_types_collection.find_one({'_id': ObjectId(service_type_id)})
@@ -501,7 +445,6 @@ def get_products_for_service_type(service_type_id):
             'is_archived': {'$ne': True}
         }).sort("product_name", 1))
         
-        serialized_products = [serialize_doc(product) for product in products]
-        return jsonify(serialized_products)
+        return jsonify(products)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
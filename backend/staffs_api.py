@@ -1,9 +1,13 @@
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING
 from bson import ObjectId
 from datetime import datetime
 import os
 
+from reference_cache import groups_cache
+from pagination import InvalidCursor, paginate
+from query_budget import query_budget
+
 # Create Blueprint for staffs routes
 staffs_bp = Blueprint('staffs', __name__)
 
@@ -21,93 +25,68 @@ def init_staffs_db(mongo_staffs_collection, mongo_users_collection, mongo_groups
     groups_collection = mongo_groups_collection
     schedules_collection = mongo_schedules_collection
 
-# Helper to convert ObjectId to string and format dates
-def serialize_doc(doc):
-    if doc:
-        doc['_id'] = str(doc['_id'])
-        if 'user_id' in doc and doc['user_id']:
-            doc['user_id'] = str(doc['user_id'])
-        
-        # Handle date formatting
-        for field in ['created_at', 'updated_at', 'last_login', 'archived_at']:
-            if field in doc and doc[field]:
-                if isinstance(doc[field], dict) and '$date' in doc[field]:
-                    doc[field] = doc[field]['$date']
-                elif isinstance(doc[field], datetime):
-                    doc[field] = doc[field].isoformat() + 'Z'
-                    
-    return doc
+def get_staff_group_ids():
+    """IDs of every role whose name contains "staff" (case-insensitive)"""
+    return [
+        group['_id'] for group in groups_cache.all()
+        if 'staff' in (group.get('group_name') or '').lower()
+    ]
+
+def staff_page(base_query, search):
+    """One page of staff users, each with its staffs record as `staff`, and the pagination block.
+
+    users, staffs and the search run in a single aggregation; roles come from
+    the cached groups. Pages follow the paginate() contract in (created_at, _id) order.
+    """
+    join = [
+        {'$lookup': {
+            'from': staffs_collection.name,
+            'localField': '_id',
+            'foreignField': 'user_id',
+            'as': 'staff'
+        }},
+        # Same record find_one({'user_id': ...}) would return
+        {'$addFields': {'staff': {'$arrayElemAt': ['$staff', 0]}}}
+    ]
+
+    pipeline = [{'$project': {'password': 0}}]
+    if not search:
+        # Only the page's own users need their staff record
+        return paginate(users_collection, base_query, 'total_staffs', 'created_at', ASCENDING,
+                        pipeline=pipeline, page_pipeline=join)
+
+    # Search user fields AND staff fields, so join before filtering
+    pipeline += join + [{'$match': {'$or': [
+        {'name': {'$regex': search, '$options': 'i'}},
+        {'username': {'$regex': search, '$options': 'i'}},
+        {'staff.studentNumber': {'$regex': search, '$options': 'i'}},
+        {'staff.course': {'$regex': search, '$options': 'i'}},
+        {'staff.section': {'$regex': search, '$options': 'i'}}
+    ]}}]
+    return paginate(users_collection, base_query, 'total_staffs', 'created_at', ASCENDING, pipeline=pipeline)
 
 # Get all active staffs with user details - UPDATED WITH SEARCH (INCLUDES STUDENT NUMBER AND COURSE)
 @staffs_bp.route('/staffs', methods=['GET'])
+@query_budget(4)
 def get_staffs():
     try:
-        # Get pagination parameters from query string
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
         search = request.args.get('search', '').strip()
         
         # Base query for staff users
         base_query = {
-            'group_id': {
-                '$in': [ObjectId(group['_id']) for group in groups_collection.find({
-                    'group_name': {'$regex': 'staff', '$options': 'i'}
-                })]
-            },
+            'group_id': {'$in': get_staff_group_ids()},
             'is_archived': {'$ne': True}
         }
         
-        # Add search functionality
-        if search:
-            # First, find staff records that match student number, course, or section
-            matching_staffs = list(staffs_collection.find({
-                '$or': [
-                    {'studentNumber': {'$regex': search, '$options': 'i'}},
-                    {'course': {'$regex': search, '$options': 'i'}},
-                    {'section': {'$regex': search, '$options': 'i'}}
-                ]
-            }))
-            
-            # Get the user IDs from matching staff records
-            matching_user_ids = [staff['user_id'] for staff in matching_staffs]
-            
-            # Build search query - search user fields AND staff fields via user_id
-            search_conditions = [
-                {'name': {'$regex': search, '$options': 'i'}},
-                {'username': {'$regex': search, '$options': 'i'}}
-            ]
-            
-            # Add staff field search if matching staff records found
-            if matching_user_ids:
-                search_conditions.append({'_id': {'$in': matching_user_ids}})
-            
-            base_query['$or'] = search_conditions
-        
-        # Calculate skip value
-        skip = (page - 1) * per_page
-        
-        # Get total count for pagination info (WITH SEARCH FILTER)
-        total_staffs = users_collection.count_documents(base_query)
-        
-        # Calculate total pages
-        total_pages = (total_staffs + per_page - 1) // per_page  # Ceiling division
-        
-        # Adjust page if it exceeds total pages
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        # Get staff users with pagination and search
-        staff_users = list(users_collection.find(base_query).skip(skip).limit(per_page))
+        staff_users, pagination = staff_page(base_query, search)
         
         # Get staff details for each staff user
         staffs = []
         for user in staff_users:
-            # Get staff details from staffs collection
-            staff = staffs_collection.find_one({'user_id': user['_id']})
+            staff = user.get('staff')
             
             # Get group name
-            group = groups_collection.find_one({'_id': ObjectId(user['group_id'])})
+            group = groups_cache.get(ObjectId(user['group_id']))
             role = group['group_name'] if group else 'Unknown'
             
             staff_data = {
@@ -128,87 +107,36 @@ def get_staffs():
         
         # Return pagination info along with staffs
         return jsonify({
-            'staffs': [serialize_doc(staff) for staff in staffs],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_staffs': total_staffs,
-                'total_pages': total_pages
-            }
+            'staffs': staffs,
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Get archived staffs - UPDATED WITH SEARCH (INCLUDES STUDENT NUMBER AND COURSE)
 @staffs_bp.route('/staffs/archived', methods=['GET'])
+@query_budget(4)
 def get_archived_staffs():
     try:
-        # Get pagination parameters from query string
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
         search = request.args.get('search', '').strip()
         
         # Base query for archived staff users
         base_query = {
-            'group_id': {
-                '$in': [ObjectId(group['_id']) for group in groups_collection.find({
-                    'group_name': {'$regex': 'staff', '$options': 'i'}
-                })]
-            },
+            'group_id': {'$in': get_staff_group_ids()},
             'is_archived': True
         }
         
-        # Add search functionality
-        if search:
-            # First, find staff records that match student number, course, or section
-            matching_staffs = list(staffs_collection.find({
-                '$or': [
-                    {'studentNumber': {'$regex': search, '$options': 'i'}},
-                    {'course': {'$regex': search, '$options': 'i'}},
-                    {'section': {'$regex': search, '$options': 'i'}}
-                ]
-            }))
-            
-            # Get the user IDs from matching staff records
-            matching_user_ids = [staff['user_id'] for staff in matching_staffs]
-            
-            # Build search query - search user fields AND staff fields via user_id
-            search_conditions = [
-                {'name': {'$regex': search, '$options': 'i'}},
-                {'username': {'$regex': search, '$options': 'i'}}
-            ]
-            
-            # Add staff field search if matching staff records found
-            if matching_user_ids:
-                search_conditions.append({'_id': {'$in': matching_user_ids}})
-            
-            base_query['$or'] = search_conditions
-        
-        # Calculate skip value
-        skip = (page - 1) * per_page
-        
-        # Get total count for pagination info (WITH SEARCH FILTER)
-        total_staffs = users_collection.count_documents(base_query)
-        
-        # Calculate total pages
-        total_pages = (total_staffs + per_page - 1) // per_page  # Ceiling division
-        
-        # Adjust page if it exceeds total pages
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        # Get archived staff users with pagination and search
-        staff_users = list(users_collection.find(base_query).skip(skip).limit(per_page))
+        staff_users, pagination = staff_page(base_query, search)
         
         # Get staff details for each archived staff user
         staffs = []
         for user in staff_users:
-            # Get staff details from staffs collection
-            staff = staffs_collection.find_one({'user_id': user['_id']})
+            staff = user.get('staff')
             
             # Get group name
-            group = groups_collection.find_one({'_id': ObjectId(user['group_id'])})
+            group = groups_cache.get(ObjectId(user['group_id']))
             role = group['group_name'] if group else 'Unknown'
             
             staff_data = {
@@ -229,14 +157,11 @@ def get_archived_staffs():
         
         # Return pagination info along with archived staffs
         return jsonify({
-            'staffs': [serialize_doc(staff) for staff in staffs],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_staffs': total_staffs,
-                'total_pages': total_pages
-            }
+            'staffs': staffs,
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -271,7 +196,7 @@ def get_staff_by_user_id(user_id):
             'updated_at': user.get('updated_at')
         }
         
-        return jsonify(serialize_doc(staff_data))
+        return jsonify(staff_data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
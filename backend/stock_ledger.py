@@ -0,0 +1,74 @@
+# stock_ledger.py
+from pymongo import ASCENDING, DESCENDING
+from bson import ObjectId
+from datetime import datetime
+
+# MongoDB collections (will be initialized from app.py)
+stock_movements_collection = None
+products_collection = None
+
+def init_stock_ledger_db(stock_movements_coll, products_coll):
+    """Initialize the collections from app.py"""
+    global stock_movements_collection, products_collection
+    stock_movements_collection = stock_movements_coll
+    products_collection = products_coll
+
+def ensure_stock_snapshots():
+    """Record the current stock of every product the first time the ledger is used"""
+    if stock_movements_collection.estimated_document_count() > 0:
+        return
+    now = datetime.utcnow()
+    snapshots = [
+        stock_movement(product['_id'], 0, product.get('stock_quantity') or 0, 'snapshot', at=now)
+        for product in products_collection.find({}, {'stock_quantity': 1})
+    ]
+    if snapshots:
+        stock_movements_collection.insert_many(snapshots, ordered=False)
+        print(f"✅ Recorded opening stock for {len(snapshots)} product(s)")
+
+def stock_movement(product_id, delta, stock_after, reason, transaction_id=None, at=None):
+    """Build a ledger entry. stock_after makes every entry a snapshot of the product's stock."""
+    movement = {
+        'product_id': ObjectId(product_id),
+        'at': at or datetime.utcnow(),
+        'delta': delta,
+        'stock_after': stock_after,
+        'reason': reason
+    }
+    if transaction_id:
+        movement['transaction_id'] = ObjectId(transaction_id)
+    return movement
+
+def record_stock_movements(movements):
+    """Append ledger entries, several in one round trip"""
+    if not movements:
+        return
+    try:
+        stock_movements_collection.insert_many(movements, ordered=False)
+    except Exception as e:
+        # The stock itself is already updated; only the audit trail is missing
+        print(f"Error recording stock movements: {e}")
+
+def record_stock_movement(product_id, delta, stock_after, reason, transaction_id=None):
+    record_stock_movements([stock_movement(product_id, delta, stock_after, reason, transaction_id)])
+
+def stock_at(product_id, at):
+    """(stock, movement) for a product at a point in time; stock is None when
+    the ledger has nothing for the product.
+
+    Deductions are clamped at zero, so deltas alone cannot rebuild the stock;
+    the nearest entry at or before `at` already carries the balance.
+    """
+    product_id = ObjectId(product_id)
+    movement = stock_movements_collection.find_one(
+        {'product_id': product_id, 'at': {'$lte': at}},
+        sort=[('at', DESCENDING), ('_id', DESCENDING)]
+    )
+    if movement:
+        return movement['stock_after'], movement
+
+    # Before the first recorded movement, the stock was what that movement started from
+    first = stock_movements_collection.find_one({'product_id': product_id}, sort=[('at', ASCENDING), ('_id', ASCENDING)])
+    if first:
+        return first['stock_after'] - first['delta'], None
+    return None, None
@@ -0,0 +1,64 @@
+# tests/conftest.py
+"""Fixtures for the backend tests.
+
+    TEST_MONGO_URI=mongodb://localhost:27017 python -m pytest tests
+
+Tests that talk to MongoDB need a local mongod: its CopyCornerSystem database
+is replaced with the benchmark dataset, so remote servers are refused. Without
+TEST_MONGO_URI those tests are skipped locally; in CI (.github/workflows/
+backend-tests.yml runs them against a mongo service) they fail instead.
+"""
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from urllib.parse import urlparse
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LOCAL_HOSTS = {'localhost', '127.0.0.1', '::1'}
+TEST_TRANSACTIONS = 500
+
+def mongo_unavailable(reason):
+    # A CI run that skipped every MongoDB test would pass without testing anything
+    if os.getenv("CI"):
+        pytest.fail(reason)
+    pytest.skip(reason)
+
+@pytest.fixture(scope='session')
+def app():
+    mongo_uri = os.getenv("TEST_MONGO_URI")
+    if not mongo_uri:
+        mongo_unavailable("TEST_MONGO_URI not set; these tests need a local mongod")
+    if urlparse(mongo_uri).hostname not in LOCAL_HOSTS:
+        mongo_unavailable(f"Refusing to replace data on {urlparse(mongo_uri).hostname}")
+
+    seed_client = MongoClient(mongo_uri, serverSelectionTimeoutMS=2000)
+    try:
+        seed_client.admin.command("ping")
+    except PyMongoError as e:
+        mongo_unavailable(f"mongod not reachable: {e}")
+
+    from benchmarks.dataset import load_dataset
+    load_dataset(seed_client["CopyCornerSystem"], TEST_TRANSACTIONS)
+    seed_client.close()
+
+    # app.py connects on import; load_dotenv() does not override these
+    os.environ["MONGO_URI"] = mongo_uri
+    import app as app_module
+    flask_app = app_module.app
+
+    # One lookup per row, the pattern the N+1 detector exists for
+    @flask_app.route('/_test/n-plus-one')
+    def n_plus_one():
+        for user in list(app_module.users_collection.find().limit(6)):
+            app_module.users_collection.find_one({'_id': user['_id']})
+        return 'ok'
+
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -1,10 +1,21 @@
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, DESCENDING
+from pymongo.errors import BulkWriteError, OperationFailure
 from bson import ObjectId
 from datetime import datetime, timedelta
 import os
 import re
 
+from counters import next_sequence, seed_counter
+from sales_rollup import record_sale_change
+from reference_cache import service_types_cache, categories_cache, get_service_category_name
+from pagination import paginate, InvalidCursor
+from exports import stream_export, get_export_format, date_range_filter, InvalidExport
+from db_indexes import TRANSACTION_SEARCH_FIELDS
+from stock_ledger import record_stock_movement
+from live_events import transaction_events
+from change_stamps import bump
+
 transactions_bp = Blueprint('transactions', __name__)
 
 transactions_collection = None
@@ -22,202 +33,220 @@ def init_transactions_relationships(service_types_coll, categories_coll):
     service_types_collection = service_types_coll
     categories_collection = categories_coll
 
-def serialize_doc(doc):
-    if not doc:
-        return doc
-    
-    serialized = {}
-    for key, value in doc.items():
-        if isinstance(value, ObjectId):
-            serialized[key] = str(value)
-        elif isinstance(value, datetime):
-            serialized[key] = value.isoformat()
-        elif isinstance(value, dict):
-            serialized[key] = serialize_doc(value)
-        elif isinstance(value, list):
-            serialized[key] = [serialize_doc(item) if isinstance(item, dict) else item for item in value]
-        else:
-            serialized[key] = value
-    return serialized
-
 def get_ph_time():
     utc_now = datetime.utcnow()
     ph_time = utc_now + timedelta(hours=8)
     return ph_time
 
+def queue_number_daily_reset():
+    # Set QUEUE_NUMBER_DAILY_RESET=true to restart queue numbers at 001 every day
+    return os.getenv("QUEUE_NUMBER_DAILY_RESET", "false").lower() in ("1", "true", "yes")
+
+def get_queue_counter_name():
+    # With daily reset every PH calendar day gets its own counter
+    if queue_number_daily_reset():
+        return f"queue_number:{get_ph_time().strftime('%Y-%m-%d')}"
+    return "queue_number"
+
+def highest_sequence(field, query=None):
+    """Largest number after the last '-' of `field` (T-042 -> 42, 007 -> 7) among matching transactions"""
+    suffix = {'$arrayElemAt': [{'$split': [f'${field}', '-']}, -1]}
+    pipeline = [
+        {'$match': dict(query or {}, **{field: {'$type': 'string'}})},
+        {'$group': {
+            '_id': None,
+            'highest': {'$max': {'$convert': {'input': suffix, 'to': 'int', 'onError': 0, 'onNull': 0}}}
+        }}
+    ]
+    result = list(transactions_collection.aggregate(pipeline))
+    return (result[0]['highest'] or 0) if result else 0
+
+def init_transaction_counters():
+    """Seed the counters from existing transactions so new numbers never collide.
+
+    Deletes lower the document count and old ids were reused after archives,
+    so the seed is the highest number in use, not the count or the newest row.
+    """
+    seed_counter("transaction_id", highest_sequence('transaction_id'))
+
+    if queue_number_daily_reset():
+        today = get_ph_time().strftime('%Y-%m-%d')
+        seed_counter(get_queue_counter_name(), highest_sequence('queue_number', {'date': today}))
+    else:
+        seed_counter("queue_number", highest_sequence('queue_number'))
+
 def generate_transaction_id():
-    transactions = list(transactions_collection.find({"is_archived": {"$ne": True}}).sort("created_at", 1))
-    if not transactions:
-        return "T-001"
-    
-    count = transactions_collection.count_documents({"is_archived": {"$ne": True}})
-    return f"T-{count + 1:03d}"
+    return f"T-{next_sequence('transaction_id'):03d}"
 
 def generate_queue_number():
-    transactions = list(transactions_collection.find({"is_archived": {"$ne": True}}).sort("created_at", 1))
-    if not transactions:
-        return "001"
-    
-    count = transactions_collection.count_documents({"is_archived": {"$ne": True}})
-    return f"{count + 1:03d}"
+    return f"{next_sequence(get_queue_counter_name()):03d}"
+
+def generate_transaction_ids(count):
+    """Reserve `count` contiguous transaction IDs with one counter update"""
+    last = next_sequence('transaction_id', count)
+    return [f"T-{seq:03d}" for seq in range(last - count + 1, last + 1)]
+
+def generate_queue_numbers(count):
+    """Reserve `count` contiguous queue numbers with one counter update"""
+    last = next_sequence(get_queue_counter_name(), count)
+    return [f"{seq:03d}" for seq in range(last - count + 1, last + 1)]
+
+# Largest batch POST /transactions/bulk accepts
+MAX_BULK_TRANSACTIONS = 100
+
+# Services whose stock is counted in sheets (total_pages x quantity)
+SHEET_SERVICES = ["Printing", "Photocopying", "Thesis Hardbound", "Softbind"]
 
-def update_product_inventory(product_id, total_pages, quantity, service_type):
+def items_for_service(service_type, total_pages, quantity):
+    """Stock units a transaction uses: sheets for paper services, items otherwise"""
+    if service_type in SHEET_SERVICES:
+        return total_pages * quantity
+    return quantity
+
+# Status from the product's own minimum_stock (5 when not set), evaluated by MongoDB
+STOCK_STATUS = {'$switch': {
+    'branches': [
+        {'case': {'$lte': ['$stock_quantity', 0]}, 'then': 'Out of Stock'},
+        {'case': {'$lte': ['$stock_quantity', {'$ifNull': ['$minimum_stock', 5]}]}, 'then': 'Low Stock'}
+    ],
+    'default': 'In Stock'
+}}
+
+def adjust_product_stock(product_id, delta, reason, transaction_id=None):
+    """Add delta (negative to deduct) to a product's stock in one atomic update.
+
+    The new stock is clamped at zero and the status re-derived on the server,
+    so concurrent completions on the same product cannot overwrite each other.
+    The change is then appended to the stock ledger.
+    """
     try:
         if not product_id:
             print("No product_id provided for inventory update")
             return False
-            
-        print(f"Updating inventory for product_id: {product_id}")
-        
-        product = products_collection.find_one({"_id": ObjectId(product_id)})
-        if not product:
-            print(f"Product not found with ID: {product_id}")
-            return False
-        
-        print(f"Found product: {product['product_name']}, Current stock: {product['stock_quantity']}")
-        
-        # Calculate items to deduct based on service type
-        if service_type in ["Printing", "Photocopying", "Thesis Hardbound", "Softbind"]:
-            items_to_deduct = total_pages * quantity
-            print(f"Paper service: {total_pages} pages × {quantity} copies = {items_to_deduct} items")
-        elif service_type in ["Tshirt Printing", "School Supplies"]:
-            items_to_deduct = quantity
-            print(f"Item service: {quantity} items")
-        else:
-            items_to_deduct = quantity
-            print(f"Other service: {quantity} items")
-        
-        new_stock = max(0, product['stock_quantity'] - items_to_deduct)
-        print(f"New stock will be: {new_stock}")
-        
-        # FIX: Use the product's actual minimum_stock value instead of hardcoded 5
-        minimum_stock = product.get('minimum_stock', 5)  # Use actual min stock, default to 5 if not set
-        
-        if new_stock <= 0:
-            status = "Out of Stock"
-        elif new_stock <= minimum_stock:  # Use the actual minimum_stock value
-            status = "Low Stock"
-        else:
-            status = "In Stock"
-        
-        print(f"Status update: {product['status']} -> {status} (min stock: {minimum_stock})")
         
-        result = products_collection.update_one(
+        # BEFORE image tells the ledger how much actually moved after clamping
+        product = products_collection.find_one_and_update(
             {'_id': ObjectId(product_id)},
-            {'$set': {
-                'stock_quantity': new_stock,
-                'status': status,
-                'updated_at': datetime.utcnow()
-            }}
+            [
+                {'$set': {
+                    'stock_quantity': {'$max': [0, {'$add': [{'$ifNull': ['$stock_quantity', 0]}, delta]}]},
+                    'updated_at': datetime.utcnow()
+                }},
+                {'$set': {'status': STOCK_STATUS}}
+            ],
+            return_document=ReturnDocument.BEFORE
         )
-        
-        print(f"Inventory update result: {result.modified_count} modified")
-        return result.modified_count > 0
-    except Exception as e:
-        print(f"Error updating inventory: {e}")
-        return False
-    
-def restore_product_inventory(product_id, total_pages, quantity, service_type):
-    try:
-        if not product_id:
-            print("No product_id provided for inventory restoration")
-            return False
-            
-        print(f"Restoring inventory for product_id: {product_id}")
-        
-        product = products_collection.find_one({"_id": ObjectId(product_id)})
         if not product:
             print(f"Product not found with ID: {product_id}")
             return False
+        bump('products')
         
-        print(f"Found product: {product['product_name']}, Current stock: {product['stock_quantity']}")
-        
-        # Calculate items to RESTORE based on service type
-        if service_type in ["Printing", "Photocopying", "Thesis Hardbound", "Softbind"]:
-            items_to_restore = total_pages * quantity
-            print(f"Paper service: Restoring {total_pages} pages × {quantity} copies = {items_to_restore} items")
-        elif service_type in ["Tshirt Printing", "School Supplies"]:
-            items_to_restore = quantity
-            print(f"Item service: Restoring {quantity} items")
-        else:
-            items_to_restore = quantity
-            print(f"Other service: Restoring {quantity} items")
-        
-        new_stock = product['stock_quantity'] + items_to_restore
-        print(f"New stock after restoration: {new_stock}")
-        
-        # FIX: Use the product's actual minimum_stock value
-        minimum_stock = product.get('minimum_stock', 5)
-        if new_stock <= 0:
-            status = "Out of Stock"
-        elif new_stock <= minimum_stock:  # Use the actual minimum_stock value
-            status = "Low Stock"
-        else:
-            status = "In Stock"
-        
-        print(f"Status after restoration: {status} (min stock: {minimum_stock})")
-        
-        result = products_collection.update_one(
-            {'_id': ObjectId(product_id)},
-            {'$set': {
-                'stock_quantity': new_stock,
-                'status': status,
-                'updated_at': datetime.utcnow()
-            }}
-        )
-        
-        print(f"Inventory restoration result: {result.modified_count} modified")
-        return result.modified_count > 0
+        old_stock = product.get('stock_quantity') or 0
+        new_stock = max(0, old_stock + delta)
+        print(f"Inventory for {product['product_name']} adjusted by {delta}: {old_stock} -> {new_stock}")
+        record_stock_movement(product['_id'], new_stock - old_stock, new_stock, reason, transaction_id)
+        return True
     except Exception as e:
-        print(f"Error restoring inventory: {e}")
+        print(f"Error updating inventory: {e}")
         return False
 
+def update_product_inventory(product_id, total_pages, quantity, service_type, transaction_id=None):
+    return adjust_product_stock(
+        product_id,
+        -items_for_service(service_type, total_pages, quantity),
+        'transaction_completed',
+        transaction_id
+    )
+
+def enrich_transactions(transactions):
+    """Attach service_category and product_data to a page of transactions.
+
+    Services and categories come from the reference cache, and every distinct
+    product on the page is resolved with one $in query instead of one lookup
+    per row.
+    """
+    product_ids = {ObjectId(t['product_id']) for t in transactions if t.get('product_id')}
+
+    products_by_id = {}
+    if product_ids:
+        for product in products_collection.find({'_id': {'$in': list(product_ids)}}):
+            products_by_id[product['_id']] = product
+
+    for transaction in transactions:
+        if transaction.get('service_type'):
+            service_type = service_types_cache.get_by_name(transaction['service_type'])
+            if service_type and service_type.get('category_id'):
+                category = categories_cache.get(service_type['category_id'])
+                transaction['service_category'] = category['name'] if category else 'Unknown'
+            else:
+                transaction['service_category'] = 'Uncategorized'
+
+        # Add product data if product_id exists
+        if transaction.get('product_id'):
+            product = products_by_id.get(ObjectId(transaction['product_id']))
+            if product:
+                transaction['product_data'] = product
+
+    return transactions
+
+# Server error code for a $text query without a text index
+INDEX_NOT_FOUND = 27
+
+# Whole words of at least three letters; anything else stays a substring search
+TEXT_SEARCH_TERMS = re.compile(r'[^\W\d_]{3,}(\s+[^\W\d_]{3,})*')
+
+def get_search_mode():
+    # ?search_mode=text (or TRANSACTION_SEARCH_MODE=text) opts in to the search_text index
+    mode = request.args.get('search_mode') or os.getenv("TRANSACTION_SEARCH_MODE", "regex")
+    return 'text' if mode.lower() == 'text' else 'regex'
+
+def regex_search_filter(search):
+    regex_pattern = re.compile(f'.*{re.escape(search)}.*', re.IGNORECASE)
+    return {'$or': [{field: regex_pattern} for field in TRANSACTION_SEARCH_FIELDS]}
+
+def build_search_filter(search):
+    """Query conditions for the search box: substring regex or, opted in, all-words text search.
+
+    Regex matches partial input anywhere in a field but has to scan. Text search
+    uses the search_text index and orders pages by relevance, but only matches
+    whole words, so short or id-like input ("Jo", "T-001") keeps using regex.
+    """
+    if get_search_mode() == 'text' and TEXT_SEARCH_TERMS.fullmatch(search):
+        # Each word quoted on its own, so all must match (in any order) instead of any one
+        return {'$text': {'$search': ' '.join(f'"{word}"' for word in search.split())}}
+    return regex_search_filter(search)
+
+def paginate_search(query, search, sort_field):
+    """paginate() transactions with the search box applied, newest sort_field first.
+
+    Falls back to regex when the search_text index is missing.
+    """
+    search_query = dict(query, **build_search_filter(search)) if search else query
+    try:
+        return paginate(transactions_collection, search_query, 'total_transactions', sort_field, DESCENDING)
+    except OperationFailure as e:
+        if '$text' not in search_query or e.code != INDEX_NOT_FOUND:
+            raise
+        print(f"⚠️ search_text index missing, searching with regex: {e}")
+        return paginate(transactions_collection, dict(query, **regex_search_filter(search)),
+                        'total_transactions', sort_field, DESCENDING)
+
 @transactions_bp.route('/transactions', methods=['GET'])
 def get_transactions():
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
-        skip = (page - 1) * per_page
-        
-        # Only fetch non-archived transactions
-        query = {"is_archived": {"$ne": True}}
-        
-        total_transactions = transactions_collection.count_documents(query)
-        total_pages = (total_transactions + per_page - 1) // per_page
-        
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        transactions_cursor = transactions_collection.find(query).sort("created_at", -1).skip(skip).limit(per_page)
-        transactions = list(transactions_cursor)
-        
-        for transaction in transactions:
-            if transaction.get('service_type'):
-                service_type = service_types_collection.find_one({'service_name': transaction['service_type']})
-                if service_type and service_type.get('category_id'):
-                    category = categories_collection.find_one({'_id': service_type['category_id']})
-                    transaction['service_category'] = category['name'] if category else 'Unknown'
-                else:
-                    transaction['service_category'] = 'Uncategorized'
-            
-            # Add product data if product_id exists
-            if transaction.get('product_id'):
-                product = products_collection.find_one({'_id': ObjectId(transaction['product_id'])})
-                if product:
-                    transaction['product_data'] = serialize_doc(product)
-        
-        serialized_transactions = [serialize_doc(transaction) for transaction in transactions]
+        # Only fetch non-archived transactions (served by a partial index)
+        query = {"is_archived": False}
         
+        transactions, pagination = paginate(transactions_collection, query, 'total_transactions', 'created_at', DESCENDING)
+
+        enrich_transactions(transactions)
+
         return jsonify({
-            'transactions': serialized_transactions,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_transactions': total_transactions,
-                'total_pages': total_pages
-            }
+            'transactions': transactions,
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -225,47 +254,75 @@ def get_transactions():
 @transactions_bp.route('/transactions/archived', methods=['GET'])
 def get_archived_transactions():
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
         search = request.args.get('search', '').strip()
-        skip = (page - 1) * per_page
         
         query = {'is_archived': True}
         
-        if search:
-            regex_pattern = re.compile(f'.*{re.escape(search)}.*', re.IGNORECASE)
-            query['$or'] = [
-                {'customer_name': regex_pattern},
-                {'queue_number': regex_pattern},
-                {'transaction_id': regex_pattern},
-                {'service_type': regex_pattern},
-                {'paper_type': regex_pattern},
-                {'size_type': regex_pattern},
-                {'supply_type': regex_pattern},
-                {'product_name': regex_pattern}  # ADDED: Search by product_name
-            ]
-        
-        total_transactions = transactions_collection.count_documents(query)
-        total_pages = (total_transactions + per_page - 1) // per_page
-        
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        transactions_cursor = transactions_collection.find(query).sort("archived_at", -1).skip(skip).limit(per_page)
-        transactions = list(transactions_cursor)
-        
-        serialized_transactions = [serialize_doc(transaction) for transaction in transactions]
+        transactions, pagination = paginate_search(query, search, 'archived_at')
         
         return jsonify({
-            'transactions': serialized_transactions,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_transactions': total_transactions,
-                'total_pages': total_pages
-            }
+            'transactions': transactions,
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Fields of a transaction sent with each live event
+TRANSACTION_EVENT_FIELDS = [
+    '_id', 'transaction_id', 'queue_number', 'customer_name', 'service_type',
+    'product_name', 'total_amount', 'date', 'status', 'is_archived'
+]
+
+def publish_transaction_event(event, transaction, **extra):
+    data = {field: transaction.get(field) for field in TRANSACTION_EVENT_FIELDS}
+    data.update(extra)
+    transaction_events.publish(event, data)
+
+# LIVE FEED OF CREATED, STATUS CHANGED AND ARCHIVED TRANSACTIONS (Server-Sent Events)
+@transactions_bp.route('/transactions/stream', methods=['GET'])
+def stream_transactions():
+    try:
+        # ?status=Pending,In Progress limits the feed to transactions entering or leaving those statuses
+        statuses = {status.strip() for status in request.args.get('status', '').split(',') if status.strip()}
+        
+        def accept(event, data):
+            return not statuses or data.get('status') in statuses or data.get('previous_status') in statuses
+        
+        return transaction_events.stream(request.headers.get('Last-Event-ID'), accept)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Columns of /transactions/export, in order
+TRANSACTION_EXPORT_FIELDS = [
+    '_id', 'transaction_id', 'queue_number', 'date', 'customer_name', 'service_type',
+    'product_name', 'paper_type', 'size_type', 'supply_type', 'total_pages',
+    'quantity', 'price_per_unit', 'total_amount', 'status', 'is_archived',
+    'created_at', 'updated_at'
+]
+
+# EXPORT TRANSACTIONS AS CSV OR NDJSON
+@transactions_bp.route('/transactions/export', methods=['GET'])
+def export_transactions():
+    try:
+        export_format = get_export_format()
+        query = date_range_filter()
+        
+        status = request.args.get('status')
+        if status:
+            query['status'] = status
+        # Archived transactions are left out unless asked for
+        if request.args.get('include_archived', 'false').lower() != 'true':
+            query['is_archived'] = False
+        
+        cursor = transactions_collection.find(
+            query, {field: 1 for field in TRANSACTION_EXPORT_FIELDS}
+        ).sort([('date', 1), ('_id', 1)])
+        
+        return stream_export(cursor, TRANSACTION_EXPORT_FIELDS, export_format, 'transactions')
+    except InvalidExport as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -277,22 +334,66 @@ def get_transaction(transaction_id):
             if transaction.get('service_type'):
                 service_type = service_types_collection.find_one({'service_name': transaction['service_type']})
                 if service_type:
-                    transaction['service_type_data'] = serialize_doc(service_type)
+                    transaction['service_type_data'] = service_type
                     if service_type.get('category_id'):
                         category = categories_collection.find_one({'_id': service_type['category_id']})
-                        transaction['service_category_data'] = serialize_doc(category) if category else None
+                        transaction['service_category_data'] = category
             
             # Add product data if product_id exists
             if transaction.get('product_id'):
                 product = products_collection.find_one({'_id': ObjectId(transaction['product_id'])})
                 if product:
-                    transaction['product_data'] = serialize_doc(product)
+                    transaction['product_data'] = product
             
-            return jsonify(serialize_doc(transaction))
+            return jsonify(transaction)
         return jsonify({'error': 'Transaction not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def build_transaction(data, transaction_id, queue_number, service_category):
+    """New Pending transaction document from the intake form fields"""
+    price_per_unit = float(data.get('price_per_unit', 0))
+    quantity = int(data.get('quantity', 1))
+    total_amount = float(data.get('total_amount', price_per_unit * quantity))
+    
+    ph_now = get_ph_time()
+    auto_date = ph_now.strftime('%Y-%m-%d')
+    
+    # Get product_id from the frontend and convert to ObjectId
+    product_id = data.get('product_id')
+    product_name = data.get('product_type', '')
+    
+    new_transaction = {
+        'queue_number': queue_number,
+        'transaction_id': transaction_id,
+        'customer_name': data['customer_name'],
+        'service_type': data['service_type'],
+        'paper_type': '',
+        'size_type': '',
+        'supply_type': '',
+        'product_id': ObjectId(product_id) if product_id else None,
+        'product_name': product_name,
+        'total_pages': int(data.get('total_pages', 0)),
+        'price_per_unit': price_per_unit,
+        'quantity': quantity,
+        'total_amount': total_amount,
+        'date': auto_date,
+        'status': 'Pending',
+        'is_archived': False,
+        'created_at': datetime.utcnow(),
+        'updated_at': datetime.utcnow()
+    }
+    
+    # Set the appropriate type field based on service category
+    if service_category == "Paper":
+        new_transaction['paper_type'] = product_name
+    elif service_category == "T-shirt":
+        new_transaction['size_type'] = product_name
+    elif service_category == "Supplies":
+        new_transaction['supply_type'] = product_name
+    
+    return new_transaction
+
 @transactions_bp.route('/transactions', methods=['POST'])
 def create_transaction():
     try:
@@ -301,65 +402,84 @@ def create_transaction():
         queue_number = generate_queue_number()
         transaction_id = generate_transaction_id()
         
-        price_per_unit = float(data.get('price_per_unit', 0))
-        quantity = int(data.get('quantity', 1))
-        total_amount = float(data.get('total_amount', price_per_unit * quantity))
-        
-        ph_now = get_ph_time()
-        auto_date = ph_now.strftime('%Y-%m-%d')
-        
-        # Get product_id from the frontend and convert to ObjectId
-        product_id = data.get('product_id')
-        product_name = data.get('product_type', '')
-        
         # Set the appropriate field based on service category
         service_category = None
         if data.get('service_type'):
-            service = service_types_collection.find_one({'service_name': data['service_type']})
-            if service and service.get('category_id'):
-                category = categories_collection.find_one({'_id': service['category_id']})
-                service_category = category['name'] if category else None
-        
-        new_transaction = {
-            'queue_number': queue_number,
-            'transaction_id': transaction_id,
-            'customer_name': data['customer_name'],
-            'service_type': data['service_type'],
-            'paper_type': '',
-            'size_type': '',
-            'supply_type': '',
-            'product_id': ObjectId(product_id) if product_id else None,
-            'product_name': product_name,
-            'total_pages': int(data.get('total_pages', 0)),
-            'price_per_unit': price_per_unit,
-            'quantity': quantity,
-            'total_amount': total_amount,
-            'date': auto_date,
-            'status': 'Pending',
-            'is_archived': False,
-            'created_at': datetime.utcnow(),
-            'updated_at': datetime.utcnow()
-        }
+            service_category = get_service_category_name(data['service_type'])
         
-        # Set the appropriate type field based on service category
-        if service_category == "Paper":
-            new_transaction['paper_type'] = product_name
-        elif service_category == "T-shirt":
-            new_transaction['size_type'] = product_name
-        elif service_category == "Supplies":
-            new_transaction['supply_type'] = product_name
-        
-        result = transactions_collection.insert_one(new_transaction)
+        new_transaction = build_transaction(data, transaction_id, queue_number, service_category)
         
-        # Get the inserted transaction and serialize it properly
-        inserted_transaction = transactions_collection.find_one({'_id': result.inserted_id})
-        serialized_transaction = serialize_doc(inserted_transaction)
+        # insert_one fills in _id, so the document can be returned as is
+        transactions_collection.insert_one(new_transaction)
+        publish_transaction_event('created', new_transaction)
         
-        return jsonify(serialized_transaction), 201
+        return jsonify(new_transaction), 201
     except Exception as e:
         print(f"Error creating transaction: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+# CREATE SEVERAL TRANSACTIONS IN ONE REQUEST
+@transactions_bp.route('/transactions/bulk', methods=['POST'])
+def create_transactions_bulk():
+    try:
+        items = (request.json or {}).get('transactions')
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'transactions must be a non-empty list'}), 400
+        if len(items) > MAX_BULK_TRANSACTIONS:
+            return jsonify({'error': f'At most {MAX_BULK_TRANSACTIONS} transactions per request'}), 400
+        
+        results = [None] * len(items)
+        valid_indexes = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get('customer_name') or not item.get('service_type'):
+                results[index] = {'index': index, 'status': 'error', 'error': 'customer_name and service_type are required'}
+            else:
+                valid_indexes.append(index)
+        
+        if valid_indexes:
+            # One counter update each for the whole batch
+            transaction_ids = generate_transaction_ids(len(valid_indexes))
+            queue_numbers = generate_queue_numbers(len(valid_indexes))
+            
+            service_categories = {}
+            documents = []
+            for position, index in enumerate(valid_indexes):
+                item = items[index]
+                try:
+                    service_type = item['service_type']
+                    if service_type not in service_categories:
+                        service_categories[service_type] = get_service_category_name(service_type)
+                    documents.append((index, build_transaction(
+                        item, transaction_ids[position], queue_numbers[position], service_categories[service_type]
+                    )))
+                except Exception as e:
+                    results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+            
+            failed = {}
+            if documents:
+                try:
+                    transactions_collection.insert_many([doc for _, doc in documents], ordered=False)
+                except BulkWriteError as e:
+                    for write_error in e.details.get('writeErrors', []):
+                        failed[write_error['index']] = write_error.get('errmsg', 'Insert failed')
+            
+            for position, (index, doc) in enumerate(documents):
+                if position in failed:
+                    results[index] = {'index': index, 'status': 'error', 'error': failed[position]}
+                else:
+                    results[index] = {'index': index, 'status': 'created', 'transaction': doc}
+                    publish_transaction_event('created', doc)
+        
+        created = sum(1 for result in results if result['status'] == 'created')
+        return jsonify({
+            'results': results,
+            'created': created,
+            'failed': len(results) - created
+        }), 201 if created else 400
+    except Exception as e:
+        print(f"Error creating transactions: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @transactions_bp.route('/transactions/<transaction_id>', methods=['PUT'])
 def update_transaction(transaction_id):
     try:
@@ -380,10 +500,7 @@ def update_transaction(transaction_id):
         # Set the appropriate field based on service category
         service_category = None
         if data.get('service_type'):
-            service = service_types_collection.find_one({'service_name': data['service_type']})
-            if service and service.get('category_id'):
-                category = categories_collection.find_one({'_id': service['category_id']})
-                service_category = category['name'] if category else None
+            service_category = get_service_category_name(data['service_type'])
         
         update_data = {
             'customer_name': data.get('customer_name', current_transaction.get('customer_name')),
@@ -410,12 +527,22 @@ def update_transaction(transaction_id):
         elif service_category == "Supplies":
             update_data['supply_type'] = product_name
         
-        result = transactions_collection.update_one(
+        # BEFORE image gives the rollup the exact state this write replaced
+        previous_transaction = transactions_collection.find_one_and_update(
             {'_id': ObjectId(transaction_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count:
+        if previous_transaction:
+            record_sale_change(previous_transaction, {**previous_transaction, **update_data})
+            
+            if previous_transaction.get('status') != update_data['status']:
+                publish_transaction_event(
+                    'status_changed', {**previous_transaction, **update_data},
+                    previous_status=previous_transaction.get('status')
+                )
+            
             # Handle inventory update when status changes to Completed
             if (current_transaction.get('status') != 'Completed' and 
                 update_data['status'] == 'Completed' and
@@ -426,7 +553,8 @@ def update_transaction(transaction_id):
                     product_id,
                     update_data['total_pages'],
                     update_data['quantity'],
-                    update_data['service_type']
+                    update_data['service_type'],
+                    transaction_id
                 )
             
             # 🆕 FIX: Handle inventory adjustment when editing COMPLETED transactions
@@ -444,20 +572,14 @@ def update_transaction(transaction_id):
                 if old_total_pages != new_total_pages or old_quantity != new_quantity:
                     print(f"Adjusting inventory for edited completed transaction")
                     
-                    # First, RESTORE the old deducted amount
-                    restore_product_inventory(
-                        product_id,
-                        old_total_pages,
-                        old_quantity,
-                        update_data['service_type']
-                    )
-                    
-                    # Then, deduct the NEW amount
-                    update_product_inventory(
+                    # Give back the old amount and take the new one in a single update
+                    service_type = update_data['service_type']
+                    adjust_product_stock(
                         product_id,
-                        new_total_pages,
-                        new_quantity,
-                        update_data['service_type']
+                        items_for_service(service_type, old_total_pages, old_quantity) -
+                        items_for_service(service_type, new_total_pages, new_quantity),
+                        'transaction_edited',
+                        transaction_id
                     )
             
             return jsonify({'message': 'Transaction updated successfully'})
@@ -474,7 +596,8 @@ def archive_transaction(transaction_id):
         if not transaction:
             return jsonify({'error': 'Transaction not found'}), 404
         
-        # Archive the transaction
+        # Archive the transaction - archived sales still count in daily_sales,
+        # the same way the sales reports have always included them
         result = transactions_collection.update_one(
             {'_id': ObjectId(transaction_id)},
             {'$set': {
@@ -485,6 +608,7 @@ def archive_transaction(transaction_id):
         )
         
         if result.modified_count:
+            publish_transaction_event('archived', {**transaction, 'is_archived': True})
             return jsonify({'message': 'Transaction archived successfully'})
         return jsonify({'error': 'Failed to archive transaction'}), 500
         
@@ -533,8 +657,9 @@ def restore_transaction(transaction_id):
 @transactions_bp.route('/transactions/<transaction_id>', methods=['DELETE'])
 def delete_transaction(transaction_id):
     try:
-        result = transactions_collection.delete_one({'_id': ObjectId(transaction_id)})
-        if result.deleted_count:
+        deleted_transaction = transactions_collection.find_one_and_delete({'_id': ObjectId(transaction_id)})
+        if deleted_transaction:
+            record_sale_change(deleted_transaction, None)
             return jsonify({'message': 'Transaction deleted successfully'})
         return jsonify({'error': 'Transaction not found'}), 404
     except Exception as e:
@@ -543,80 +668,34 @@ def delete_transaction(transaction_id):
 @transactions_bp.route('/transactions/status/<status>', methods=['GET'])
 def get_transactions_by_status(status):
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
         search = request.args.get('search', '').strip()
-        skip = (page - 1) * per_page
         
         # Build query with search
-        query = {'status': status, 'is_archived': {'$ne': True}}
-        
-        if search:
-            regex_pattern = re.compile(f'.*{re.escape(search)}.*', re.IGNORECASE)
-            query['$or'] = [
-                {'customer_name': regex_pattern},
-                {'queue_number': regex_pattern},
-                {'transaction_id': regex_pattern},
-                {'service_type': regex_pattern},
-                {'paper_type': regex_pattern},
-                {'size_type': regex_pattern},
-                {'supply_type': regex_pattern},
-                {'product_name': regex_pattern}  # ADDED: Search by product_name
-            ]
-        
-        total_transactions = transactions_collection.count_documents(query)
-        total_pages = (total_transactions + per_page - 1) // per_page
-        
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        transactions_cursor = transactions_collection.find(query).sort("created_at", -1).skip(skip).limit(per_page)
-        transactions = list(transactions_cursor)
+        query = {'status': status, 'is_archived': False}
         
-        serialized_transactions = [serialize_doc(transaction) for transaction in transactions]
+        transactions, pagination = paginate_search(query, search, 'created_at')
         
         return jsonify({
-            'transactions': serialized_transactions,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_transactions': total_transactions,
-                'total_pages': total_pages
-            }
+            'transactions': transactions,
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @transactions_bp.route('/transactions/service-type/<service_type_name>', methods=['GET'])
 def get_transactions_by_service_type(service_type_name):
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
-        skip = (page - 1) * per_page
-        
-        query = {'service_type': service_type_name, "is_archived": {"$ne": True}}
-        
-        total_transactions = transactions_collection.count_documents(query)
-        total_pages = (total_transactions + per_page - 1) // per_page
-        
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        transactions_cursor = transactions_collection.find(query).sort("created_at", -1).skip(skip).limit(per_page)
-        transactions = list(transactions_cursor)
+        query = {'service_type': service_type_name, "is_archived": False}
         
-        serialized_transactions = [serialize_doc(transaction) for transaction in transactions]
+        transactions, pagination = paginate(transactions_collection, query, 'total_transactions', 'created_at', DESCENDING)
         
         return jsonify({
-            'transactions': serialized_transactions,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_transactions': total_transactions,
-                'total_pages': total_pages
-            }
+            'transactions': transactions,
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
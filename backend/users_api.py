@@ -1,9 +1,14 @@
 from flask import Blueprint, request, jsonify
-from pymongo import MongoClient
+from pymongo import MongoClient, DESCENDING
 from bson import ObjectId
 from datetime import datetime
 import os
-import bcrypt
+
+from reference_cache import groups_cache
+from pagination import paginate, InvalidCursor
+from passwords import hash_password
+from change_stamps import conditional_get
+from query_budget import query_budget
 
 # Create Blueprint for users routes
 users_bp = Blueprint('users', __name__)
@@ -14,36 +19,6 @@ groups_collection = None
 staffs_collection = None
 schedules_collection = None
 
-# Password hashing helper functions
-def hash_password(password):
-    """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-
-def check_password(plain_password, hashed_password):
-    """Check if a plain password matches the hashed password"""
-    if not hashed_password:
-        return False
-        
-    try:
-        # If hashed_password is bytes (from bcrypt)
-        if isinstance(hashed_password, bytes):
-            return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password)
-        # If hashed_password is string (might be from migration)
-        elif isinstance(hashed_password, str):
-            # Try to decode as base64 first (if it was encoded for storage)
-            import base64
-            try:
-                hashed_bytes = base64.b64decode(hashed_password)
-                return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_bytes)
-            except:
-                # If it's not base64, try direct string comparison (for legacy)
-                return hashed_password == plain_password
-        else:
-            return False
-    except Exception as e:
-        print(f"Password check error: {e}")
-        return False
-
 def init_users_db(mongo_users_collection, mongo_groups_collection, mongo_staffs_collection, mongo_schedules_collection):
     """Initialize the collections from app.py"""
     global users_collection, groups_collection, staffs_collection, schedules_collection
@@ -52,52 +27,40 @@ def init_users_db(mongo_users_collection, mongo_groups_collection, mongo_staffs_
     staffs_collection = mongo_staffs_collection
     schedules_collection = mongo_schedules_collection
 
-# Helper to convert ObjectId to string and format dates
-def serialize_doc(doc):
-    if doc:
-        # Create a copy to avoid modifying the original
-        serialized = doc.copy()
-        
-        serialized['_id'] = str(doc['_id'])
-        if 'group_id' in doc and doc['group_id']:
-            serialized['group_id'] = str(doc['group_id'])
-        
-        # REMOVE PASSWORD COMPLETELY - don't send it to frontend
-        if 'password' in serialized:
-            del serialized['password']
-        
-        # Handle last_login date formatting
-        if 'last_login' in doc and doc['last_login']:
-            if isinstance(doc['last_login'], dict) and '$date' in doc['last_login']:
-                serialized['last_login'] = doc['last_login']['$date']
-            elif isinstance(doc['last_login'], datetime):
-                serialized['last_login'] = doc['last_login'].isoformat() + 'Z'
-            else:
-                serialized['last_login'] = str(doc['last_login'])
-        else:
-            serialized['last_login'] = None
-        
-        # Handle created_at and updated_at dates if needed
-        for field in ['created_at', 'updated_at', 'archived_at']:
-            if field in doc and doc[field]:
-                if isinstance(doc[field], dict) and '$date' in doc[field]:
-                    serialized[field] = doc[field]['$date']
-                elif isinstance(doc[field], datetime):
-                    serialized[field] = doc[field].isoformat() + 'Z'
-                else:
-                    serialized[field] = str(doc[field])
-            else:
-                serialized[field] = None
-                    
-    return serialized
+# Users are never sent with their password hash
+def public_user(user):
+    return {key: value for key, value in user.items() if key != 'password'}
+
+def add_role_and_staff_details(users):
+    """Attach role, studentNumber, course and section to a page of users.
+
+    Roles come from the cached groups and staff details from one $in query,
+    so a page costs the same number of queries whatever its size.
+    """
+    staff_user_ids = []
+    for user in users:
+        group = groups_cache.get(ObjectId(user['group_id'])) if user.get('group_id') else None
+        user['role'] = group['group_name'] if group else 'Unknown'
+        if group and 'staff' in group['group_name'].lower():
+            staff_user_ids.append(user['_id'])
+
+    staffs_by_user = {}
+    if staff_user_ids:
+        for staff in staffs_collection.find({'user_id': {'$in': staff_user_ids}}):
+            staffs_by_user.setdefault(staff['user_id'], staff)
+
+    for user in users:
+        staff = staffs_by_user.get(user['_id'], {})
+        user['studentNumber'] = staff.get('studentNumber', '')
+        user['course'] = staff.get('course', '')
+        user['section'] = staff.get('section', '')
+    return users
 
 # Get all users with group names - UPDATED FOR PAGINATION AND ARCHIVE
 @users_bp.route('/users', methods=['GET'])
+@query_budget(6)
 def get_users():
     try:
-        # Get pagination parameters from query string
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
         search = request.args.get('search', '').strip()
         
         # Base query for non-archived users
@@ -126,72 +89,26 @@ def get_users():
             
             query['$or'] = search_conditions
         
-        # Calculate skip value
-        skip = (page - 1) * per_page
-        
-        # Get total count for pagination info (WITH SEARCH FILTER)
-        total_users = users_collection.count_documents(query)
-        
-        # Calculate total pages
-        total_pages = (total_users + per_page - 1) // per_page  # Ceiling division
+        page_users, pagination = paginate(users_collection, query, 'total_users')
+        users = add_role_and_staff_details(page_users)
         
-        # If requested page is beyond available pages, go to last page
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        # Get paginated users (ALREADY FILTERED BY SEARCH)
-        users_cursor = users_collection.find(query).skip(skip).limit(per_page)
-        users = []
-        
-        for user in users_cursor:
-            # Look up group name separately
-            if user.get('group_id'):
-                group = groups_collection.find_one({'_id': ObjectId(user['group_id'])})
-                user['role'] = group['group_name'] if group else 'Unknown'
-            else:
-                user['role'] = 'Unknown'
-            
-            # For staff users, get staff details
-            if group and 'staff' in group['group_name'].lower():
-                staff = staffs_collection.find_one({'user_id': user['_id']})
-                if staff:
-                    user['studentNumber'] = staff.get('studentNumber', '')
-                    user['course'] = staff.get('course', '')
-                    user['section'] = staff.get('section', '')
-                else:
-                    user['studentNumber'] = ''
-                    user['course'] = ''
-                    user['section'] = ''
-            else:
-                user['studentNumber'] = ''
-                user['course'] = ''
-                user['section'] = ''
-            
-            users.append(user)
-        
-        serialized_users = [serialize_doc(user) for user in users]
+        serialized_users = [public_user(user) for user in users]
         
         # Return pagination info along with users
         return jsonify({
             'users': serialized_users,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_users': total_users,
-                'total_pages': total_pages
-            }
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # GET ARCHIVED USERS
 @users_bp.route('/users/archived', methods=['GET'])
+@query_budget(6)
 def get_archived_users():
     try:
-        # Get pagination parameters from query string
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
         search = request.args.get('search', '').strip()
         
         # Base query for archived users
@@ -220,66 +137,23 @@ def get_archived_users():
             
             query['$or'] = search_conditions
         
-        # Calculate skip value
-        skip = (page - 1) * per_page
-        
-        # Get total count for pagination info (WITH SEARCH FILTER)
-        total_users = users_collection.count_documents(query)
+        page_users, pagination = paginate(users_collection, query, 'total_users', 'archived_at', DESCENDING)
+        users = add_role_and_staff_details(page_users)
         
-        # Calculate total pages
-        total_pages = (total_users + per_page - 1) // per_page
-        
-        # If requested page is beyond available pages, go to last page
-        if page > total_pages and total_pages > 0:
-            page = total_pages
-            skip = (page - 1) * per_page
-        
-        # Get paginated archived users (ALREADY FILTERED BY SEARCH)
-        users_cursor = users_collection.find(query).sort("archived_at", -1).skip(skip).limit(per_page)
-        users = []
-        
-        for user in users_cursor:
-            # Look up group name separately
-            if user.get('group_id'):
-                group = groups_collection.find_one({'_id': ObjectId(user['group_id'])})
-                user['role'] = group['group_name'] if group else 'Unknown'
-            else:
-                user['role'] = 'Unknown'
-            
-            # For staff users, get staff details
-            if group and 'staff' in group['group_name'].lower():
-                staff = staffs_collection.find_one({'user_id': user['_id']})
-                if staff:
-                    user['studentNumber'] = staff.get('studentNumber', '')
-                    user['course'] = staff.get('course', '')
-                    user['section'] = staff.get('section', '')
-                else:
-                    user['studentNumber'] = ''
-                    user['course'] = ''
-                    user['section'] = ''
-            else:
-                user['studentNumber'] = ''
-                user['course'] = ''
-                user['section'] = ''
-            
-            users.append(user)
-        
-        serialized_users = [serialize_doc(user) for user in users]
+        serialized_users = [public_user(user) for user in users]
         
         return jsonify({
             'users': serialized_users,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_users': total_users,
-                'total_pages': total_pages
-            }
+            'pagination': pagination
         })
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Get available roles (from groups collection)
 @users_bp.route('/users/roles', methods=['GET'])
+@conditional_get('groups')
 def get_roles():
     try:
         groups = list(groups_collection.find({}, {'group_name': 1}))
@@ -295,7 +169,7 @@ def create_user():
         data = request.json
         
         # Get the group ID based on selected role
-        group = groups_collection.find_one({'group_name': data['role']})
+        group = groups_cache.get_by_name(data['role'])
         if not group:
             return jsonify({'error': 'Invalid role selected'}), 400
         
@@ -338,7 +212,7 @@ def create_user():
             
             staffs_collection.insert_one(staff_data)
         
-        return jsonify(serialize_doc(new_user)), 201
+        return jsonify(public_user(new_user)), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -349,7 +223,7 @@ def update_user(user_id):
         data = request.json
         
         # Get the group ID based on selected role
-        group = groups_collection.find_one({'group_name': data['role']})
+        group = groups_cache.get_by_name(data['role'])
         if not group:
             return jsonify({'error': 'Invalid role selected'}), 400
         
@@ -13,9 +13,8 @@ ChartJS.register(ArcElement, Tooltip, Legend, ChartDataLabels);
 
 function DashboardUI() {
     const [dashboardData, setDashboardData] = useState({
-        products: [],
-        staff: [],
-        transactions: [],
+        totals: { products: 0, staffs: 0, transactions: 0 },
+        recentTransactions: [],
         lowStockItems: [],
         salesByService: { labels: [], data: [] },
         overallSales: 0
@@ -36,50 +35,17 @@ function DashboardUI() {
                 setLoading(true);
                 console.log("Fetching dashboard data from API...");
 
-                // Fetch all data in parallel
-                const [
-                    productsResponse,
-                    staffResponse,
-                    transactionsResponse,
-                    salesByServiceResponse,
-                    salesAnalyticsResponse
-                ] = await Promise.all([
-                    fetch(`${API_BASE}/products?page=1&per_page=1000`).then(res => res.json()),
-                    fetch(`${API_BASE}/staffs?page=1&per_page=1000`).then(res => res.json()),
-                    fetch(`${API_BASE}/transactions?page=1&per_page=1000`).then(res => res.json()),
-                    fetch(`${API_BASE}/sales/by-service-type`).then(res => res.json()),
-                    fetch(`${API_BASE}/sales/analytics`).then(res => res.json())
-                ]);
+                // Counts, short lists and sales totals come pre-computed in one call
+                const summary = await fetch(`${API_BASE}/dashboard/summary`).then(res => res.json());
 
-                console.log("API Responses:", {
-                    products: productsResponse,
-                    staff: staffResponse,
-                    transactions: transactionsResponse,
-                    salesByService: salesByServiceResponse,
-                    salesAnalytics: salesAnalyticsResponse
-                });
-
-                // Extract data from responses
-                const products = productsResponse.products || [];
-                const staff = staffResponse.staffs || [];
-                const transactions = transactionsResponse.transactions || [];
-                const salesByService = salesByServiceResponse || { labels: [], data: [] };
-                const overallSales = salesAnalyticsResponse.summary?.weekly_sales || 0;
-
-                // Calculate low stock items (stock <= minimum_stock or stock <= 10)
-                const lowStockItems = products.filter(product => {
-                    const stock = parseInt(product.stock_quantity);
-                    const minStock = parseInt(product.minimum_stock) || 10;
-                    return stock <= minStock;
-                });
+                console.log("API Response:", summary);
 
                 setDashboardData({
-                    products,
-                    staff,
-                    transactions,
-                    lowStockItems,
-                    salesByService,
-                    overallSales
+                    totals: summary.totals || { products: 0, staffs: 0, transactions: 0 },
+                    recentTransactions: summary.recent_transactions || [],
+                    lowStockItems: summary.low_stock_items || [],
+                    salesByService: summary.sales_by_service || { labels: [], data: [] },
+                    overallSales: summary.overall_sales || 0
                 });
 
             } catch (error) {
@@ -90,16 +56,47 @@ function DashboardUI() {
         };
 
         fetchDashboardData();
-        
-        // Refresh data every 30 seconds
-        const interval = setInterval(fetchDashboardData, 30000);
-        return () => clearInterval(interval);
+
+        // Refresh when a transaction is created, changes status or is archived;
+        // several events in a row cause one reload
+        let refreshTimer;
+        let reconnectTimer;
+        let events;
+        const scheduleRefresh = () => {
+            clearTimeout(refreshTimer);
+            refreshTimer = setTimeout(fetchDashboardData, 500);
+        };
+        const connect = () => {
+            events = new EventSource(`${API_BASE}/transactions/stream`);
+            ["created", "status_changed", "archived", "resync"].forEach(type =>
+                events.addEventListener(type, scheduleRefresh)
+            );
+            // A refused stream (e.g. 503 when the server is full) is not retried
+            // by the browser, so try again later; the slow poll covers the gap
+            events.onerror = () => {
+                if (events.readyState === EventSource.CLOSED) {
+                    clearTimeout(reconnectTimer);
+                    reconnectTimer = setTimeout(connect, 60000);
+                }
+            };
+        };
+        connect();
+
+        // Slow poll for changes that are not transaction events, or while the stream is down
+        const interval = setInterval(fetchDashboardData, 90000);
+
+        return () => {
+            events.close();
+            clearTimeout(refreshTimer);
+            clearTimeout(reconnectTimer);
+            clearInterval(interval);
+        };
     }, []);
 
     // Calculate summary statistics
-    const totalProducts = dashboardData.products.length;
-    const totalStaff = dashboardData.staff.length;
-    const totalTransactions = dashboardData.transactions.length;
+    const totalProducts = dashboardData.totals.products;
+    const totalStaff = dashboardData.totals.staffs;
+    const totalTransactions = dashboardData.totals.transactions;
     const overallSales = dashboardData.overallSales;
 
     // Summary Cards with real data
@@ -131,11 +128,8 @@ function DashboardUI() {
         ],
     };
 
-    // Get recent completed transactions only (most recent 5)
-    const recentTransactions = dashboardData.transactions
-        .filter(transaction => transaction.status === 'Completed')
-        .sort((a, b) => new Date(b.created_at) - new Date(a.created_at))
-        .slice(0, 5);
+    // Most recent 5 completed transactions, already filtered and sorted by the backend
+    const recentTransactions = dashboardData.recentTransactions;
 
     if (loading) {
         return (